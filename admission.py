@@ -0,0 +1,130 @@
+"""Admission control for LLM-bound endpoints.
+
+``AdmissionController.turn(session_id, priority)`` is an async context manager
+that, in order:
+
+* rejects with 429 when the session already has ``max_per_session`` turns
+  running or waiting,
+* serializes turns of the same session (one in flight, processed in arrival order),
+* waits for one of ``max_concurrent`` upstream slots in a priority queue
+  (lower number first, FIFO within a priority), and
+* sheds load with 503 instead of queueing once the expected or actual queue
+  wait exceeds ``queue_slo`` seconds.
+
+Rejections carry a ``Retry-After`` header. Cheap endpoints never enter the
+controller, so they stay responsive while the LLM path is saturated.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+import metrics
+
+QUEUE_SECONDS = metrics.histogram(
+    "admission_queue_seconds", "Time spent waiting for an upstream slot", labels=("controller",)
+)
+REJECTIONS = metrics.counter(
+    "admission_rejections_total", "Requests shed by admission control", labels=("controller", "reason")
+)
+
+
+class Overloaded(HTTPException):
+    """Raised when a request is shed; rendered by FastAPI with its ``Retry-After`` header."""
+
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(status_code=status_code, detail=detail,
+                         headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class AdmissionController:
+    def __init__(self, name, max_concurrent=None, max_queue=None, queue_slo=None, max_per_session=None):
+        self.name = name
+        self.max_concurrent = max_concurrent or int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+        self.max_queue = max_queue or int(os.environ.get("LLM_MAX_QUEUE", 64))
+        self.queue_slo = queue_slo or float(os.environ.get("LLM_QUEUE_SLO", 5.0))
+        self.max_per_session = max_per_session or int(os.environ.get("SESSION_MAX_PENDING", 2))
+        self.active = 0
+        self.queued = 0
+        self._waiters = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+        self._service_time = 0.0  # EWMA of how long a slot is held, seconds
+        self._sessions = {}  # session id -> [lock, pending turns]
+
+        metrics.gauge(f"{name}_inflight", f"Requests holding a {name} slot", lambda: self.active)
+        metrics.gauge(f"{name}_queued", f"Requests waiting for a {name} slot", lambda: self.queued)
+
+    def expected_wait(self):
+        """Rough queue wait for a new arrival, from the current backlog and mean service time."""
+        return (self.queued + 1) * self._service_time / self.max_concurrent
+
+    def _reject(self, status_code, reason, detail, retry_after):
+        REJECTIONS.inc(self.name, reason)
+        raise Overloaded(status_code, detail, retry_after)
+
+    async def _acquire(self, priority):
+        if self.active < self.max_concurrent and not self.queued:
+            self.active += 1
+            return
+
+        if self.queued >= self.max_queue:
+            self._reject(503, "queue_full", "Server is busy, please retry shortly", self.expected_wait())
+        if self.expected_wait() > self.queue_slo:
+            self._reject(503, "slo", "Server is busy, please retry shortly", self.expected_wait())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            # The slot is handed over by _release, which leaves ``active`` unchanged
+            await asyncio.wait_for(future, self.queue_slo)
+        except asyncio.TimeoutError:
+            self._reject(503, "timeout", "Server is busy, please retry shortly", self.expected_wait())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._hand_over()  # granted just as the caller went away
+            raise
+        finally:
+            self.queued -= 1
+            QUEUE_SECONDS.observe(time.perf_counter() - start, self.name)
+
+    def _release(self, held):
+        self._service_time = held if not self._service_time else 0.8 * self._service_time + 0.2 * held
+        self._hand_over()
+
+    def _hand_over(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():  # skip waiters that timed out or disconnected
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def turn(self, session_id, priority=0):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[session_id] = [asyncio.Lock(), 0]
+        if entry[1] >= self.max_per_session:
+            self._reject(429, "session", "A previous request for this session is still running",
+                         self._service_time)
+
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._acquire(priority)
+                start = time.perf_counter()
+                try:
+                    yield
+                finally:
+                    self._release(time.perf_counter() - start)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._sessions.pop(session_id, None)
@@ -0,0 +1,341 @@
+"""Population-level symptom and condition trends in constant memory.
+
+Every ``/predict`` and ``/assessment`` result is folded into the current
+time bucket (``BUCKET_SECONDS`` wide, ``RETENTION_BUCKETS`` kept):
+
+* a count-min sketch counts ``(district, symptom)`` and ``(district, condition)``
+  pairs, plus the same pairs for the ``*`` (all districts) pseudo-district
+  and per-district event totals, and
+* space-saving summaries keep the heaviest pairs of the bucket, which are
+  the candidates for top-k and rising-trend queries.
+
+Neither grows with traffic, so memory is bounded by the configuration, and a
+query touches at most ``window x TOP_K_CAPACITY`` candidates, with windows
+capped at ``MAX_WINDOW_HOURS``. Buckets are written to
+``ANALYTICS_DIR/<service>.json`` every ``FLUSH_SECONDS`` (only when something
+changed, re-serializing only the buckets that did) and loaded back in a
+worker thread after start-up; until then queries see only what was recorded
+since, and nothing is flushed over the snapshot.
+"""
+import array
+import asyncio
+import base64
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+
+from log import get_logger
+
+logger = get_logger("analytics")
+
+BUCKET_SECONDS = 3600
+RETENTION_BUCKETS = 24 * 7
+MAX_WINDOW_HOURS = RETENTION_BUCKETS * BUCKET_SECONDS // 3600
+SKETCH_WIDTH = 1024
+SKETCH_DEPTH = 4
+TOP_K_CAPACITY = 256
+FLUSH_SECONDS = 60
+ANALYTICS_DIR = os.environ.get("ANALYTICS_DIR", "analytics")
+ALL_DISTRICTS = "*"
+
+
+def _normalize(value):
+    # "|" separates the parts of sketch and summary keys
+    return " ".join(value.replace("|", " ").split()).lower() if value else ""
+
+
+class CountMinSketch:
+    """Approximate counts that never under-estimate; over-estimates are bounded by width."""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else array.array("q", bytes(8 * width * depth))
+
+    def cells(self, key):
+        """Table positions of ``key``; the same for every sketch of this width and depth."""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        # Double hashing gives ``depth`` independent-enough rows from one digest
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        for cell in self.cells(key):
+            self.table[cell] += count
+
+    def merge(self, other):
+        for cell, count in enumerate(other.table):
+            self.table[cell] += count
+
+    def estimate(self, key, cells=None):
+        return min(self.table[cell] for cell in cells or self.cells(key))
+
+    def to_dict(self):
+        return {"width": self.width, "depth": self.depth, "table": base64.b64encode(self.table.tobytes()).decode()}
+
+    @classmethod
+    def from_dict(cls, data):
+        table = array.array("q")
+        table.frombytes(base64.b64decode(data["table"]))
+        return cls(data["width"], data["depth"], table)
+
+
+class SpaceSaving:
+    """Heavy hitters: keeps the ``capacity`` most frequent ``group|name`` keys with bounded over-counting.
+
+    ``group(g)`` lists the tracked keys of one group without scanning the rest.
+    """
+
+    def __init__(self, capacity=TOP_K_CAPACITY, counts=None):
+        self.capacity = capacity
+        self.counts = counts if counts is not None else {}
+        self.groups = {}  # group -> {key: name}
+        for key in self.counts:
+            self._index(key)
+
+    def _index(self, key):
+        group, _, name = key.partition("|")
+        self.groups.setdefault(group, {})[key] = name
+
+    def _unindex(self, key):
+        group = key.partition("|")[0]
+        members = self.groups[group]
+        del members[key]
+        if not members:
+            del self.groups[group]
+
+    def add(self, key, count=1):
+        if key in self.counts:
+            self.counts[key] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[key] = count
+        else:
+            # Evict the smallest entry; the newcomer inherits its count as an upper bound
+            smallest = min(self.counts, key=self.counts.get)
+            self.counts[key] = self.counts.pop(smallest) + count
+            self._unindex(smallest)
+        self._index(key)
+
+    def group(self, group):
+        """``(name, count)`` for every tracked key of ``group``."""
+        return [(name, self.counts[key]) for key, name in self.groups.get(group, {}).items()]
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.add(key, count)
+
+    def to_dict(self):
+        return {"capacity": self.capacity, "counts": dict(self.counts)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["capacity"], data["counts"])
+
+
+class Bucket:
+    def __init__(self, start):
+        self.start = start
+        self.sketch = CountMinSketch()
+        self.top = {"symptom": SpaceSaving(), "condition": SpaceSaving()}
+
+    def to_dict(self):
+        return {
+            "start": self.start,
+            "sketch": self.sketch.to_dict(),
+            "top": {kind: summary.to_dict() for kind, summary in self.top.items()}
+        }
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        for kind, summary in other.top.items():
+            self.top[kind].merge(summary)
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls(data["start"])
+        bucket.sketch = CountMinSketch.from_dict(data["sketch"])
+        bucket.top = {kind: SpaceSaving.from_dict(summary) for kind, summary in data["top"].items()}
+        return bucket
+
+
+class Analytics:
+    def __init__(self, path=None, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.buckets = {}  # bucket start -> Bucket
+        self._dirty = set()  # starts of buckets changed since the last flush
+        self._serialized = {}  # bucket start -> JSON written by the last flush
+        # record() runs on the event loop, flush() in a worker thread
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # Set once load() has run; flushing earlier would overwrite the snapshot
+        self.loaded = threading.Event()
+
+    def _bucket(self, now):
+        start = int(now // BUCKET_SECONDS * BUCKET_SECONDS)
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = Bucket(start)
+            oldest = start - RETENTION_BUCKETS * BUCKET_SECONDS
+            for expired in [key for key in self.buckets if key <= oldest]:
+                del self.buckets[expired]
+        return bucket
+
+    def record(self, source, district=None, symptoms=(), condition=None):
+        """Count one prediction or assessment from ``source`` in ``district``."""
+        district = _normalize(district) or "unknown"
+        with self._lock:
+            bucket = self._bucket(self.clock())
+            self._dirty.add(bucket.start)
+            for area in (district, ALL_DISTRICTS):
+                bucket.sketch.add(f"events|{area}")
+                bucket.sketch.add(f"events|{area}|{source}")
+            pairs = [("symptom", _normalize(symptom)) for symptom in set(symptoms)]
+            if condition:
+                pairs.append(("condition", _normalize(condition)))
+            for kind, name in pairs:
+                if not name:
+                    continue
+                for area in (district, ALL_DISTRICTS):
+                    bucket.sketch.add(f"{kind}|{area}|{name}")
+                    bucket.top[kind].add(f"{area}|{name}")
+
+    def _window(self, hours, offset=0):
+        now = self.clock()
+        current = int(now // BUCKET_SECONDS * BUCKET_SECONDS)
+        count = min(RETENTION_BUCKETS, max(1, int(hours * 3600 // BUCKET_SECONDS)))
+        starts = [current - (offset + i) * BUCKET_SECONDS for i in range(count)]
+        return [self.buckets[start] for start in starts if start in self.buckets]
+
+    def trends(self, district=None, hours=24, k=10):
+        """Top symptoms and conditions in the last ``hours`` for a district, with the previous window for comparison."""
+        area = _normalize(district) or ALL_DISTRICTS
+        with self._lock:
+            window = self._window(hours)
+            previous = self._window(hours, offset=max(1, int(hours * 3600 // BUCKET_SECONDS)))
+            if not window and not previous:
+                return {"district": area, "window_hours": hours, "events": 0, "previous_events": 0,
+                        "top_symptoms": [], "rising_symptoms": [], "top_conditions": [], "rising_conditions": []}
+            # Every bucket's sketch has the same shape, so each key is hashed once per query
+            sketch = (window or previous)[0].sketch
+
+            def total(buckets, key, cells):
+                return sum(bucket.sketch.estimate(key, cells) for bucket in buckets)
+
+            events = f"events|{area}"
+            events_cells = sketch.cells(events)
+            result = {
+                "district": area,
+                "window_hours": hours,
+                "events": total(window, events, events_cells),
+                "previous_events": total(previous, events, events_cells)
+            }
+            for kind in ("symptom", "condition"):
+                candidates = {}
+                for bucket in window:
+                    for name, count in bucket.top[kind].group(area):
+                        candidates[name] = candidates.get(name, 0) + count
+                top = heapq.nlargest(k, candidates.items(), key=lambda item: item[1])
+
+                rows = []
+                for name, _ in top:
+                    key = f"{kind}|{area}|{name}"
+                    cells = sketch.cells(key)
+                    count = total(window, key, cells)
+                    before = total(previous, key, cells)
+                    rows.append({"name": name, "count": count, "previous": before, "change": count - before})
+                result[f"top_{kind}s"] = rows
+                result[f"rising_{kind}s"] = sorted((row for row in rows if row["change"] > 0), key=lambda row: -row["change"])
+        return result
+
+    def series(self, kind, name, district=None, hours=24):
+        """Per-bucket counts of one symptom or condition, oldest first."""
+        area = _normalize(district) or ALL_DISTRICTS
+        key = f"{kind}|{area}|{_normalize(name)}"
+        with self._lock:
+            window = self._window(hours)
+            return [{"start": bucket.start, "count": bucket.sketch.estimate(key)} for bucket in reversed(window)]
+
+    def flush(self):
+        if not self.path or not self.loaded.is_set():
+            return
+        with self._flush_lock:
+            with self._lock:
+                # Copies of the changed buckets only; encoding happens without blocking record()
+                changed = {start: self.buckets[start].to_dict() for start in self._dirty if start in self.buckets}
+                live = set(self.buckets)
+                self._dirty.clear()
+            if not changed and live == set(self._serialized):
+                return
+            for start, data in changed.items():
+                self._serialized[start] = json.dumps(data)
+            for start in set(self._serialized) - live:
+                del self._serialized[start]
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temporary = f"{self.path}.tmp"
+            try:
+                with open(temporary, "w") as f:
+                    f.write(f'{{"bucket_seconds": {BUCKET_SECONDS}, "buckets": [')
+                    f.write(", ".join(self._serialized[start] for start in sorted(self._serialized)))
+                    f.write("]}")
+                os.replace(temporary, self.path)
+            except OSError:
+                with self._lock:
+                    self._dirty.update(changed)
+                raise
+
+    def load(self):
+        """Merge the snapshot into the buckets, keeping whatever was recorded while it loaded."""
+        try:
+            if not self.path or not os.path.exists(self.path):
+                return
+            with open(self.path) as f:
+                snapshot = json.load(f)
+            if snapshot.get("bucket_seconds") != BUCKET_SECONDS:
+                logger.warning("Ignoring analytics snapshot with a different bucket width")
+                return
+            # Decoded without the lock; record() and queries only wait for the merge
+            loaded = [Bucket.from_dict(data) for data in snapshot["buckets"]]
+            with self._lock:
+                for bucket in loaded:
+                    if bucket.start in self.buckets:
+                        self.buckets[bucket.start].merge(bucket)
+                    else:
+                        self.buckets[bucket.start] = bucket
+                    self._dirty.add(bucket.start)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not load analytics snapshot %s: %s", self.path, e)
+        finally:
+            self.loaded.set()
+
+    async def flush_periodically(self, interval=FLUSH_SECONDS):
+        """Load the snapshot off the event loop, then flush every ``interval`` seconds."""
+        await asyncio.to_thread(self.load)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except OSError as e:
+                logger.warning("Analytics flush failed: %s", e)
+
+
+def install(app, service):
+    """Create the service's Analytics; after start-up load its snapshot, then flush it periodically and on shutdown."""
+    analytics = Analytics(os.path.join(ANALYTICS_DIR, f"{service}.json"))
+
+    async def start_flushing():
+        app.state.analytics_flush = asyncio.create_task(analytics.flush_periodically())
+
+    async def stop_flushing():
+        app.state.analytics_flush.cancel()
+        await asyncio.to_thread(analytics.flush)
+
+    app.router.add_event_handler("startup", start_flushing)
+    app.router.add_event_handler("shutdown", stop_flushing)
+    return analytics
@@ -1,10 +1,23 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
+import asyncio
+import gzip
+from functools import lru_cache
 from app import MedicalAssistant
+from log import get_logger
+from singleflight import SingleFlight
+import analytics
+import audit
+import metrics
+import profiling
+import warmup
+import wire
 
-app = FastAPI()
+logger = get_logger("api")
+
+app = FastAPI(default_response_class=wire.ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -14,56 +27,146 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+wire.install(app)
+metrics.install(app)
+
+@lru_cache(maxsize=1)
+def get_medical_assistant():
+    """The shared MedicalAssistant, built on first use rather than at import."""
+    logger.info("Initializing Medical Assistant")
+    return MedicalAssistant()
+
+def warm_knowledge_base():
+    assistant = get_medical_assistant()
+    assistant._triage_index()
+    assistant.compile_languages()
 
-# Initialize the medical assistant
-print("Initializing Medical Assistant (will download model on first run)...")
-medical_assistant = MedicalAssistant()
-print("Medical Assistant initialized!")
+warmup.install(app, warm_knowledge_base)
+
+predict_flight = SingleFlight("predict")
+trends = analytics.install(app, "api")
+audit_log = audit.install(app, "api")
+profiling.install(app)
 
 class SymptomsRequest(BaseModel):
     symptoms: List[str]
+    # Optional, only used for population-level /analytics
+    district: Optional[str] = None
+
+class TriageRequest(BaseModel):
+    # Answers so far, in the order asked: symptom -> whether the patient has it
+    answers: Dict[str, bool] = {}
+    max_questions: Optional[int] = None
+
+class PredictionResponse(BaseModel):
+    predicted_disease: str
+    confidence: int
+    matching_symptoms: List[str] = []
+    description: Optional[str] = None
+    message: Optional[str] = None
+    # Set when the request asked for a language
+    display_name: Optional[str] = None
+    lang: Optional[str] = None
+
+class SymptomsResponse(BaseModel):
+    disease: str
+    symptoms: List[str]
+    description: str
+    found: bool
+    note: Optional[str] = None
+    source: Optional[str] = None
+    display_name: Optional[str] = None
+    lang: Optional[str] = None
+
+def normalize_symptoms(symptoms):
+    """KB names for known symptoms (any case or language), lower case for the rest, sorted"""
+    assistant = get_medical_assistant()
+    known = set(assistant.all_symptoms)
+    return sorted(symptom if symptom in known else symptom.lower() for symptom in assistant.canonical_symptoms(symptoms))
+
+async def score_symptoms(symptoms):
+    with metrics.span("kb_scoring"):
+        return await asyncio.to_thread(get_medical_assistant().predict_disease_from_symptoms, symptoms)
 
-@app.post("/predict")
-async def predict_disease(request: SymptomsRequest):
+@app.post("/predict", response_model=PredictionResponse)
+async def predict_disease(request: SymptomsRequest, http_request: Request, fields: Optional[str] = None, lang: Optional[str] = None):
     try:
-        prediction = medical_assistant.predict_disease_from_symptoms(request.symptoms)
-        return prediction
+        # Case and order variants score the normalized list, so they share one run and one result
+        symptoms = normalize_symptoms(request.symptoms)
+        prediction = await predict_flight.do(tuple(symptoms), lambda: score_symptoms(symptoms))
+        condition = prediction.get("predicted_disease")
+        trends.record("predict", request.district, symptoms, condition if condition not in ("Unknown", "Error") else None)
+        if lang:
+            # Precompiled string tables; predicted_disease stays the canonical KB name
+            prediction = get_medical_assistant().localize(prediction, lang)
+        audit_log.record("predict", symptoms=request.symptoms, district=request.district, result=prediction)
+        return wire.respond(http_request, prediction, fields)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/symptoms/{disease}")
-async def get_disease_symptoms(disease: str):
+@app.post("/triage/next")
+async def triage_next(request: TriageRequest):
     try:
-        # Log the request for debugging
-        print(f"Received request for disease: {disease}")
-        
-        # Get symptoms from the medical assistant
-        disease_info = medical_assistant.get_disease_symptoms(disease)
-        print(f"Retrieved disease info: {disease_info}")
-        
-        # Ensure response format matches what the frontend expects
-        # The frontend expects: disease, symptoms, description, found, and optional note
-        response = {
-            "disease": disease_info.get("disease", disease),
-            "symptoms": disease_info.get("symptoms", []),
-            "description": disease_info.get("description", ""),
-            "found": disease_info.get("found", False)
-        }
-        
-        # Add note if present
-        if "note" in disease_info:
-            response["note"] = disease_info["note"]
-            
-        # Add source if present (but not required by frontend)
-        if "source" in disease_info:
-            response["source"] = disease_info["source"]
-            
-        print(f"Sending response: {response}")
-        return response
+        with metrics.span("triage"):
+            return get_medical_assistant().triage_next(request.answers, request.max_questions)
     except Exception as e:
-        print(f"Error in get_disease_symptoms: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/symptoms/{disease}", response_model=SymptomsResponse, response_model_exclude_none=True)
+async def get_disease_symptoms(disease: str, request: Request, fields: Optional[str] = None, lang: Optional[str] = None):
+    try:
+        # get_disease_symptoms always returns the shape the frontend expects
+        # (disease, symptoms, description, found and an optional note)
+        with metrics.span("kb_lookup"):
+            disease_info = get_medical_assistant().get_disease_symptoms(disease)
+            if lang:
+                disease_info = get_medical_assistant().localize(disease_info, lang)
+        return wire.respond(request, disease_info, fields)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in get_disease_symptoms: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics")
+async def get_analytics(request: Request, district: Optional[str] = None,
+                        hours: int = Query(24, ge=1, le=analytics.MAX_WINDOW_HOURS), k: int = Query(10, ge=1, le=100),
+                        symptom: Optional[str] = None, condition: Optional[str] = None, fields: Optional[str] = None):
+    """Top and rising symptoms and conditions over the last ``hours``; ``symptom`` or ``condition`` adds its hourly series."""
+    result = trends.trends(district, hours, k)
+    if symptom:
+        result["series"] = trends.series("symptom", symptom, district, hours)
+    elif condition:
+        result["series"] = trends.series("condition", condition, district, hours)
+    return wire.respond(request, result, fields)
+
+# Serialized (and gzip-compressed) bundles by (kb hash, since); the KB changes rarely
+_bundle_bodies = {}
+
+@app.get("/kb/bundle")
+async def get_kb_bundle(request: Request, since: Optional[int] = None, hash: Optional[str] = None):
+    assistant = get_medical_assistant()
+    etag = f'"{assistant.kb_hash()}"'
+    if etag in [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "X-KB-Version": str(assistant.kb_version)})
+
+    bundle = assistant.export_kb_bundle(since, hash)
+    key = (bundle["hash"], bundle["since"])
+    if key not in _bundle_bodies:
+        if len(_bundle_bodies) > 64:
+            _bundle_bodies.clear()
+        body = wire.dumps(bundle)
+        _bundle_bodies[key] = (body, gzip.compress(body, compresslevel=9))
+    body, compressed = _bundle_bodies[key]
+
+    headers = {"ETag": etag, "X-KB-Version": str(bundle["version"]), "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        body = compressed
+    return Response(content=body, media_type="application/json", headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080) 
\ No newline at end of file
@@ -1,10 +1,52 @@
-import re
 import os
+import json
+import hashlib
+import math
 import random
+import sys
 import time
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from log import get_logger
+import translations
+
+logger = get_logger("medical_assistant")
+
+# Fixed response text, translated along with the knowledge base (see translations.py)
+PARTIAL_MATCH_NOTE = "Partial match found"
+FLU_LIKE_SYMPTOMS = ["Fever", "Body aches", "Fatigue", "Cough", "Headache"]
+FLU_LIKE_DESCRIPTION = "A viral respiratory infection with flu-like symptoms."
+GENERAL_SYMPTOMS = [
+    "Pain or discomfort", 
+    "Changes in normal function", 
+    "Inflammation or swelling", 
+    "Fatigue or weakness",
+    "General feeling of unwellness"
+]
+GENERAL_DESCRIPTION = "A medical condition with generalized symptoms."
+LOOKUP_ERROR_SYMPTOMS = ["Pain", "Discomfort", "Changes in normal function", "Inflammation", "General unwellness"]
+LOOKUP_ERROR_DESCRIPTION = "Information based on general medical patterns"
+NOT_ENOUGH_SYMPTOMS = "Not enough symptoms to make a prediction."
+NO_MATCH_MESSAGE = "Could not find a matching condition. Please consult a healthcare professional."
+PREDICTION_ERROR_MESSAGE = "An error occurred while processing your symptoms."
+PREDICTION_MESSAGE = (
+    "Based on your symptoms, you may have {disease}.\n"
+    "Confidence: {confidence}%\n"
+    "Matching symptoms: {matching}\n"
+    "\nDescription: {description}\n"
+    "\nNote: This is not a medical diagnosis. Please consult with a healthcare professional."
+)
+RESPONSE_STRINGS = [
+    "Unknown", "Error", PARTIAL_MATCH_NOTE, *FLU_LIKE_SYMPTOMS, FLU_LIKE_DESCRIPTION, *GENERAL_SYMPTOMS,
+    GENERAL_DESCRIPTION, *LOOKUP_ERROR_SYMPTOMS, LOOKUP_ERROR_DESCRIPTION, NOT_ENOUGH_SYMPTOMS,
+    NO_MATCH_MESSAGE, PREDICTION_ERROR_MESSAGE, PREDICTION_MESSAGE
+]
+
 class MedicalAssistant:
-    def __init__(self):
-        """Initialize medical assistant with knowledge base"""
+    def __init__(self, medical_knowledge=None):
+        """Initialize medical assistant with knowledge base (the built-in one unless given)"""
         # Comprehensive medical knowledge base
         self.medical_knowledge = {
             "Flu": {
@@ -12,64 +54,358 @@ class MedicalAssistant:
                     "High fever", "Body aches", "Fatigue", 
                     "Respiratory symptoms", "Headache"
                 ],
-                "description": "A contagious respiratory illness caused by influenza viruses."
+                "description": "A contagious respiratory illness caused by influenza viruses.",
+                "aliases": ["Influenza"]
             },
             "COVID-19": {
                 "symptoms": [
                     "Fever", "Dry cough", "Tiredness", 
                     "Loss of taste or smell", "Shortness of breath"
                 ],
-                "description": "A highly infectious respiratory disease caused by the SARS-CoV-2 virus."
+                "description": "A highly infectious respiratory disease caused by the SARS-CoV-2 virus.",
+                "aliases": ["Covid", "Coronavirus", "SARS-CoV-2"]
             },
             "Pneumonia": {
                 "symptoms": [
                     "Chest pain", "Difficulty breathing", 
                     "Persistent cough", "Fever", "Chills"
                 ],
-                "description": "An infection that inflames the air sacs in one or both lungs."
+                "description": "An infection that inflames the air sacs in one or both lungs.",
+                "aliases": ["Lung infection"]
             },
             "Diabetes": {
                 "symptoms": [
                     "Increased thirst", "Frequent urination", 
                     "Extreme hunger", "Unexplained weight loss", "Fatigue"
                 ],
-                "description": "A chronic condition affecting how your body turns food into energy."
+                "description": "A chronic condition affecting how your body turns food into energy.",
+                "aliases": ["Diabetes mellitus", "High blood sugar"]
             },
             "Migraine": {
                 "symptoms": [
                     "Severe headache", "Sensitivity to light", 
                     "Nausea", "Vomiting", "Visual disturbances"
                 ],
-                "description": "A neurological condition causing intense, debilitating headaches."
+                "description": "A neurological condition causing intense, debilitating headaches.",
+                "aliases": ["Migraine headache"]
             },
             "Hypertension": {
                 "symptoms": [
                     "Headaches", "Shortness of breath", 
                     "Nosebleeds", "Flushing", "Dizziness"
                 ],
-                "description": "A condition where blood pressure against artery walls is consistently too high."
+                "description": "A condition where blood pressure against artery walls is consistently too high.",
+                "aliases": ["High blood pressure"]
             },
             "Asthma": {
                 "symptoms": [
                     "Shortness of breath", "Chest tightness", 
                     "Wheezing", "Coughing", "Difficulty breathing during physical activity"
                 ],
-                "description": "A condition affecting airways in the lungs, causing breathing difficulties."
+                "description": "A condition affecting airways in the lungs, causing breathing difficulties.",
+                "aliases": ["Bronchial asthma"]
             }
         }
         
+        if medical_knowledge is not None:
+            self.medical_knowledge = medical_knowledge
+        
         # All unique symptoms for symptom-based diagnosis
         self.all_symptoms = []
         for disease, details in self.medical_knowledge.items():
             for symptom in details["symptoms"]:
                 if symptom not in self.all_symptoms:
                     self.all_symptoms.append(symptom)
+        
+        # Versioning for the offline client bundle. The interned symptom table
+        # is append-only so symptom ids stay valid across versions and deltas.
+        # Version numbers restart with the process, so a delta is only sent to
+        # a client whose version and content hash both match this process's.
+        self.kb_version = 1
+        self._version_hashes = {}
+        self.symptom_table = list(self.all_symptoms)
+        self._symptom_ids = {symptom: i for i, symptom in enumerate(self.symptom_table)}
+        self._initial_symptom_count = len(self.symptom_table)
+        # (version, disease, symptom table length after, symptom ids before the change)
+        self._kb_changes = []
+        self._bundle_cache = {}
+
+    def _intern_symptom(self, symptom):
+        if symptom not in self._symptom_ids:
+            self._symptom_ids[symptom] = len(self.symptom_table)
+            self.symptom_table.append(symptom)
+        return self._symptom_ids[symptom]
+
+    def _record_change(self, disease, previous_details):
+        previous_ids = [self._symptom_ids[symptom] for symptom in previous_details["symptoms"]] if previous_details else []
+        self.kb_version += 1
+        self._kb_changes.append((self.kb_version, disease, len(self.symptom_table), previous_ids))
+        self.all_symptoms = []
+        for details in self.medical_knowledge.values():
+            for symptom in details["symptoms"]:
+                if symptom not in self.all_symptoms:
+                    self.all_symptoms.append(symptom)
+        self._bundle_cache.clear()
+
+    def _remember_hash(self):
+        self._version_hashes.setdefault(self.kb_version, self.kb_hash())
+
+    def _hash_at(self, version):
+        return self.kb_hash() if version == self.kb_version else self._version_hashes.get(version)
+
+    def update_disease(self, disease, symptoms, description, aliases=None):
+        """Add or replace a disease in the knowledge base and bump the KB version"""
+        self._remember_hash()
+        for symptom in symptoms:
+            self._intern_symptom(symptom)
+        previous_details = self.medical_knowledge.get(disease)
+        self.medical_knowledge[disease] = {
+            "symptoms": list(symptoms),
+            "description": description,
+            "aliases": list(aliases or [])
+        }
+        self._record_change(disease, previous_details)
+
+    def remove_disease(self, disease):
+        """Remove a disease from the knowledge base and bump the KB version"""
+        self._remember_hash()
+        previous_details = self.medical_knowledge.pop(disease, None)
+        if previous_details is not None:
+            self._record_change(disease, previous_details)
+
+    def kb_hash(self):
+        """Content hash of the knowledge base, used by clients to verify an applied delta"""
+        cached = getattr(self, "_hash_cache", None)
+        if cached and cached[0] == self.kb_version:
+            return cached[1]
+        canonical = json.dumps(self.medical_knowledge, sort_keys=True, separators=(",", ":"))
+        digest = hashlib.sha256(canonical.encode()).hexdigest()[:16]
+        self._hash_cache = (self.kb_version, digest)
+        return digest
+
+    def export_kb_bundle(self, since=None, since_hash=None):
+        """Export the knowledge base as a compact, versioned bundle for offline clients.
+
+        Symptoms are sent once in an interned table and diseases refer to them by
+        id. ``index`` maps symptom id -> diseases so clients can score without
+        scanning. With ``since`` and ``since_hash`` set to the version and hash
+        the client already has, only changed diseases, new symptoms and the
+        affected index entries are sent; any other client (a version from an
+        earlier deploy, a missing or mismatched hash) gets the full bundle.
+        """
+        if since is None or not 1 <= since <= self.kb_version or since_hash is None or since_hash != self._hash_at(since):
+            since = None
+        if since in self._bundle_cache:
+            return self._bundle_cache[since]
+
+        if since is None:
+            changed = set(self.medical_knowledge)
+            touched_symptoms = set(range(len(self.symptom_table)))
+            symptoms_offset = 0
+        else:
+            changes = [change for change in self._kb_changes if change[0] > since]
+            changed = {change[1] for change in changes}
+            # Postings of a disease's old symptoms must be resent too, or the client keeps stale entries
+            touched_symptoms = {symptom_id for change in changes for symptom_id in change[3]}
+            earlier = [change[2] for change in self._kb_changes if change[0] <= since]
+            symptoms_offset = earlier[-1] if earlier else self._initial_symptom_count
+
+        diseases = {}
+        removed = []
+        for disease in sorted(changed):
+            details = self.medical_knowledge.get(disease)
+            if details is None:
+                removed.append(disease)
+                continue
+            ids = [self._symptom_ids[symptom] for symptom in details["symptoms"]]
+            touched_symptoms.update(ids)
+            entry = {"s": ids, "d": details["description"]}
+            if details.get("aliases"):
+                entry["a"] = details["aliases"]
+            diseases[disease] = entry
+
+        index = {symptom_id: [] for symptom_id in sorted(touched_symptoms)}
+        for disease, details in self.medical_knowledge.items():
+            for symptom in details["symptoms"]:
+                symptom_id = self._symptom_ids[symptom]
+                if symptom_id in index:
+                    index[symptom_id].append(disease)
+
+        bundle = {
+            "version": self.kb_version,
+            "since": since,
+            "hash": self.kb_hash(),
+            "symptoms_offset": symptoms_offset,
+            "symptoms": self.symptom_table[symptoms_offset:],
+            "diseases": diseases,
+            "removed": removed,
+            "index": {str(symptom_id): names for symptom_id, names in index.items()}
+        }
+        self._bundle_cache[since] = bundle
+        return bundle
+
+    def translatable_strings(self):
+        """Every display string a response can contain: KB names, aliases, symptoms, descriptions and fixed messages"""
+        texts = []
+        for disease, details in self.medical_knowledge.items():
+            texts.append(disease)
+            texts.extend(details.get("aliases", []))
+            texts.extend(details["symptoms"])
+            texts.append(details["description"])
+        texts.extend(RESPONSE_STRINGS)
+        return list(dict.fromkeys(texts))
+
+    def _input_index(self):
+        """Native-language and KB names (normalized) -> KB disease and symptom names, over every available language"""
+        if getattr(self, "_input_cache", None) and self._input_cache[0] == self.kb_version:
+            return self._input_cache[1]
+        
+        caches = [translations.load(lang) for lang in sorted(translations.AVAILABLE_LANGUAGES)]
+        diseases = {}
+        symptoms = {}
+        for cache in filter(None, caches):
+            for disease, details in self.medical_knowledge.items():
+                for name in [disease, *details.get("aliases", [])]:
+                    for variant in [cache.strings.get(name), *cache.aliases.get(name, [])]:
+                        if variant:
+                            diseases.setdefault(translations.normalize(variant), disease)
+            for symptom in self.all_symptoms:
+                for variant in [cache.strings.get(symptom), *cache.aliases.get(symptom, [])]:
+                    if variant:
+                        symptoms.setdefault(translations.normalize(variant), symptom)
+        for symptom in self.all_symptoms:
+            symptoms.setdefault(translations.normalize(symptom), symptom)
+        
+        index = {"diseases": diseases, "symptoms": symptoms}
+        self._input_cache = (self.kb_version, index)
+        return index
+
+    def _localization(self, lang):
+        """Normalized display string -> its ``lang`` translation (English if missing), or None if ``lang`` has no cache"""
+        cached = getattr(self, "_localization_cache", {}).get(lang)
+        if cached and cached[0] == self.kb_version:
+            return cached[1]
+        
+        cache = translations.load(lang)
+        if cache is None:
+            return None
+        table = {translations.normalize(text): cache.strings.get(text, text) for text in self.translatable_strings()}
+        if not hasattr(self, "_localization_cache"):
+            self._localization_cache = {}
+        self._localization_cache[lang] = (self.kb_version, table)
+        return table
+
+    def canonical_symptoms(self, symptoms):
+        """Replace native-language and other-case symptom names with their KB names; other input is kept as given"""
+        symptom_names = self._input_index()["symptoms"]
+        return [symptom_names.get(translations.normalize(symptom), symptom) for symptom in symptoms]
+
+    def compile_languages(self):
+        """Build the input index and every language's display table ahead of the first request"""
+        self._input_index()
+        for lang in translations.AVAILABLE_LANGUAGES:
+            self._localization(lang)
+
+    def localize(self, result, lang):
+        """Return a ``get_disease_symptoms``/``predict_disease_from_symptoms`` result for display in ``lang``.
+        
+        Disease names stay canonical (they key doctors, analytics and the audit
+        log) and the translated name goes in ``display_name``. ``lang`` in the
+        result is the language actually used: English if ``lang`` has no cache.
+        """
+        code = translations.language_code(lang)
+        table = self._localization(code) if code != translations.DEFAULT_LANGUAGE else None
+        if table is None:
+            return dict(result, lang=translations.DEFAULT_LANGUAGE)
+        
+        def translate(text):
+            return table.get(translations.normalize(text), text)
+        
+        localized = dict(result, lang=code)
+        disease = result.get("predicted_disease", result.get("disease"))
+        if disease:
+            localized["display_name"] = translate(disease)
+        for key in ("symptoms", "matching_symptoms"):
+            if key in result:
+                localized[key] = [translate(symptom) for symptom in result[key]]
+        for key in ("description", "note"):
+            if result.get(key):
+                localized[key] = translate(result[key])
+        if result.get("message"):
+            if result.get("matching_symptoms"):
+                localized["message"] = translate(PREDICTION_MESSAGE).format(
+                    disease=localized["display_name"],
+                    confidence=result["confidence"],
+                    matching=", ".join(localized["matching_symptoms"]),
+                    description=localized.get("description", "")
+                )
+            else:
+                localized["message"] = translate(result["message"])
+        return localized
+
+    def _triage_index(self):
+        """Disease order and per-symptom disease bitmasks for the current KB version"""
+        if getattr(self, "_triage_cache", None) and self._triage_cache[0] == self.kb_version:
+            return self._triage_cache[1]
+        
+        diseases = list(self.medical_knowledge)
+        symptoms_of = [list(dict.fromkeys(self.medical_knowledge[disease]["symptoms"])) for disease in diseases]
+        symptom_masks = {}
+        for position, symptoms in enumerate(symptoms_of):
+            for symptom in symptoms:
+                symptom_masks[symptom] = symptom_masks.get(symptom, 0) | (1 << position)
+        counts = {symptom: mask.bit_count() for symptom, mask in symptom_masks.items()}
+        
+        index = (diseases, symptom_masks, symptoms_of, counts)
+        self._triage_cache = (self.kb_version, index)
+        return index
+
+    def start_triage(self):
+        """Start an interactive triage over the whole knowledge base"""
+        return TriageSession(*self._triage_index())
+
+    def triage_next(self, answers, max_questions=None):
+        """Replay ``{symptom: present}`` answers and return the next question or a result.
+        
+        Each question is the symptom that splits the remaining candidates most
+        evenly, so the candidate set roughly halves with every answer.
+        """
+        session = self.start_triage()
+        for symptom, present in answers.items():
+            session.answer(symptom, present)
+        
+        question = None
+        if max_questions is None or len(answers) < max_questions:
+            question = session.best_question()
+        
+        candidates = session.candidates()
+        result = {
+            "done": question is None,
+            "question": question,
+            "candidates": candidates,
+            "remaining": len(candidates),
+            "asked": len(answers)
+        }
+        if question is None and candidates:
+            present = [symptom for symptom, answer in answers.items() if answer]
+            best = max(candidates, key=lambda d: sum(s in self.medical_knowledge[d]["symptoms"] for s in present))
+            details = self.medical_knowledge[best]
+            matching = [s for s in present if s in details["symptoms"]]
+            result["prediction"] = {
+                "predicted_disease": best,
+                "confidence": int(100 * len(matching) / len(details["symptoms"])) if details["symptoms"] else 0,
+                "matching_symptoms": matching,
+                "description": details["description"]
+            }
+        return result
 
     def get_disease_symptoms(self, disease_name):
         """Get symptoms for a specific disease"""
         try:
             # Clean up disease name for case-insensitive matching
             disease_name = disease_name.strip()
+            # Native-language names and aliases resolve to the KB name
+            disease_name = self._input_index()["diseases"].get(translations.normalize(disease_name), disease_name)
             disease_name_lower = disease_name.lower()
             
             # Try to find the disease in our knowledge base (case-insensitive)
@@ -90,38 +426,32 @@ class MedicalAssistant:
                         "symptoms": details["symptoms"],
                         "description": details["description"],
                         "found": True,
-                        "note": "Partial match found"
+                        "note": PARTIAL_MATCH_NOTE
                     }
             
             # Rule-based approach for common disease patterns
             if "flu" in disease_name_lower or "influenza" in disease_name_lower:
                 return {
                     "disease": disease_name,
-                    "symptoms": ["Fever", "Body aches", "Fatigue", "Cough", "Headache"],
-                    "description": "A viral respiratory infection with flu-like symptoms.",
+                    "symptoms": FLU_LIKE_SYMPTOMS,
+                    "description": FLU_LIKE_DESCRIPTION,
                     "found": False
                 }
                 
             # Ultimate fallback - generalized symptoms
             return {
                 "disease": disease_name,
-                "symptoms": [
-                    "Pain or discomfort", 
-                    "Changes in normal function", 
-                    "Inflammation or swelling", 
-                    "Fatigue or weakness",
-                    "General feeling of unwellness"
-                ],
-                "description": "A medical condition with generalized symptoms.",
+                "symptoms": GENERAL_SYMPTOMS,
+                "description": GENERAL_DESCRIPTION,
                 "found": False
             }
             
         except Exception as e:
-            print(f"Error getting disease symptoms: {e}")
+            logger.error("Error getting disease symptoms: %s", e)
             return {
                 "disease": disease_name,
-                "symptoms": ["Pain", "Discomfort", "Changes in normal function", "Inflammation", "General unwellness"],
-                "description": "Information based on general medical patterns",
+                "symptoms": LOOKUP_ERROR_SYMPTOMS,
+                "description": LOOKUP_ERROR_DESCRIPTION,
                 "found": False
             }
             
@@ -132,9 +462,11 @@ class MedicalAssistant:
                 return {
                     "predicted_disease": "Unknown",
                     "confidence": 0,
-                    "message": "Not enough symptoms to make a prediction."
+                    "message": NOT_ENOUGH_SYMPTOMS
                 }
             
+            selected_symptoms = self.canonical_symptoms(selected_symptoms)
+            
             # Calculate match score for each disease
             disease_scores = {}
             for disease, details in self.medical_knowledge.items():
@@ -167,7 +499,7 @@ class MedicalAssistant:
                 return {
                     "predicted_disease": "Unknown",
                     "confidence": 0,
-                    "message": "Could not find a matching condition. Please consult a healthcare professional."
+                    "message": NO_MATCH_MESSAGE
                 }
             
             # Get top disease
@@ -175,11 +507,12 @@ class MedicalAssistant:
             confidence = int(details["score"] * 100)
             
             # Format message
-            message = f"Based on your symptoms, you may have {top_disease}.\n"
-            message += f"Confidence: {confidence}%\n"
-            message += f"Matching symptoms: {', '.join(details['matching'])}\n"
-            message += f"\nDescription: {details['description']}\n"
-            message += "\nNote: This is not a medical diagnosis. Please consult with a healthcare professional."
+            message = PREDICTION_MESSAGE.format(
+                disease=top_disease,
+                confidence=confidence,
+                matching=", ".join(details["matching"]),
+                description=details["description"]
+            )
             
             # Return prediction
             return {
@@ -191,19 +524,75 @@ class MedicalAssistant:
             }
             
         except Exception as e:
-            print(f"Error predicting disease: {e}")
+            logger.error("Error predicting disease: %s", e)
             return {
                 "predicted_disease": "Error",
                 "confidence": 0,
-                "message": "An error occurred while processing your symptoms."
+                "message": PREDICTION_ERROR_MESSAGE
             }
 
+class TriageSession:
+    """Candidate diseases as a bitset, narrowed by yes/no symptom answers.
+    
+    ``counts`` holds, for every symptom, how many remaining candidates have it.
+    It is updated incrementally from the incidence matrix as candidates are
+    eliminated, so picking the next question never rescans the whole KB.
+    """
+    
+    def __init__(self, diseases, symptom_masks, symptoms_of, counts):
+        self.diseases = diseases
+        self.symptom_masks = symptom_masks
+        self._symptoms_of = symptoms_of
+        self.counts = dict(counts)
+        self.mask = (1 << len(diseases)) - 1
+        self.asked = set()
+    
+    def answer(self, symptom, present):
+        """Apply an answer; one that would rule out every remaining candidate is ignored"""
+        self.asked.add(symptom)
+        symptom_mask = self.symptom_masks.get(symptom, 0)
+        narrowed = self.mask & symptom_mask if present else self.mask & ~symptom_mask
+        if not narrowed:
+            return
+        
+        eliminated = self.mask & ~narrowed
+        while eliminated:
+            lowest = eliminated & -eliminated
+            for other in self._symptoms_of[lowest.bit_length() - 1]:
+                self.counts[other] -= 1
+            eliminated ^= lowest
+        self.mask = narrowed
+    
+    def best_question(self):
+        """Unasked symptom with maximum information gain, or None if nothing splits the candidates"""
+        remaining = self.mask.bit_count()
+        if remaining <= 1:
+            return None
+        
+        best, best_gain = None, 0.0
+        for symptom, count in self.counts.items():
+            if symptom in self.asked or count == 0 or count == remaining:
+                continue
+            p = count / remaining
+            gain = -(p * math.log2(p) + (1 - p) * math.log2(1 - p))
+            if gain > best_gain:
+                best, best_gain = symptom, gain
+        return best
+    
+    def candidates(self):
+        return [disease for position, disease in enumerate(self.diseases) if self.mask >> position & 1]
+
 def clear_screen():
     """Clear the terminal screen"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    # ANSI clear + cursor home instead of spawning a `clear` subprocess per screen
+    if sys.stdout.isatty():
+        print("\033[2J\033[H", end="", flush=True)
 
 def simulate_loading(message="Processing", duration=1.5):
     """Show a simple loading animation"""
+    # Never sleep when output is piped or redirected
+    if not sys.stdout.isatty():
+        return
     for _ in range(3):
         for char in [".  ", ".. ", "..."]:
             print(f"\r{message}{char}", end="", flush=True)
@@ -356,8 +745,8 @@ def main():
             input("\nPress Enter to continue...")
             
             # Show a selection of common symptoms
-            common_symptoms = medical_assistant.all_symptoms
-            random.shuffle(common_symptoms)  # Randomize to get different symptoms each time
+            # Randomize to get different symptoms each time, without reordering the shared list
+            common_symptoms = random.sample(medical_assistant.all_symptoms, len(medical_assistant.all_symptoms))
             
             # First show a selection of common symptoms
             print_header("SELECT YOUR SYMPTOMS")
@@ -421,7 +810,93 @@ def main():
         print_footer()
         input("\nPress Enter to continue...")
 
+def _init_batch_worker():
+    global _batch_assistant
+    _batch_assistant = MedicalAssistant()
+
+def _score_batch_chunk(lines):
+    """Score a chunk of JSONL cases in a worker process; returns output lines in input order"""
+    results = []
+    for line in lines:
+        try:
+            case = json.loads(line)
+            symptoms = case.get("symptoms", [])
+            if not isinstance(symptoms, list) or not all(isinstance(symptom, str) for symptom in symptoms):
+                results.append(json.dumps({"id": case.get("id"), "error": "Invalid case: symptoms must be a list of strings"}, ensure_ascii=False))
+                continue
+            result = {"id": case.get("id")}
+            result.update(_batch_assistant.predict_disease_from_symptoms(symptoms))
+        except Exception as e:
+            result = {"id": None, "error": f"Invalid case: {e}"}
+        results.append(json.dumps(result, ensure_ascii=False))
+    return results
+
+def _read_chunks(lines, chunk_size):
+    chunk = []
+    for line in lines:
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def run_batch(in_path, out_path, workers=None, chunk_size=500):
+    """Score a JSONL file of ``{"id", "symptoms"}`` cases into a JSONL file of predictions.
+    
+    Input is streamed in chunks to a process pool with at most two chunks in
+    flight per worker, and results are written in input order, so memory
+    stays bounded regardless of the file size. Use ``-`` for stdin/stdout.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    cases = 0
+    
+    fin = sys.stdin if in_path == "-" else open(in_path, encoding="utf-8")
+    fout = sys.stdout if out_path == "-" else open(out_path, "w", encoding="utf-8")
+    try:
+        # Spawned, not forked: a forked worker inherits log.py's queue but not its listener thread
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_batch_worker) as pool:
+            pending = deque()
+            for chunk in _read_chunks(fin, chunk_size):
+                pending.append(pool.submit(_score_batch_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    results = pending.popleft().result()
+                    fout.write("\n".join(results) + "\n")
+                    cases += len(results)
+            while pending:
+                results = pending.popleft().result()
+                fout.write("\n".join(results) + "\n")
+                cases += len(results)
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+    
+    elapsed = time.perf_counter() - start
+    print(f"Scored {cases} cases in {elapsed:.2f}s ({cases / elapsed if elapsed else 0:.0f} cases/s) "
+          f"with {workers} workers", file=sys.stderr)
+    return cases
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Medical Symptom Checker")
+    subparsers = parser.add_subparsers(dest="command")
+    batch = subparsers.add_parser("batch", help="Score a JSONL file of cases non-interactively")
+    batch.add_argument("--in", dest="in_path", required=True, help="input JSONL with {\"id\", \"symptoms\"} per line, or -")
+    batch.add_argument("--out", dest="out_path", required=True, help="output JSONL path, or -")
+    batch.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    batch.add_argument("--chunk-size", type=int, default=500, help="cases per task sent to a worker")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "batch":
+        run_batch(args.in_path, args.out_path, args.workers, args.chunk_size)
+        sys.exit(0)
+    
     try:
         main()
     except KeyboardInterrupt:
@@ -0,0 +1,319 @@
+"""Append-only audit log of predictions and assessments.
+
+Handlers call ``AuditLog.record(kind, **fields)``, which appends a dict to an
+in-memory deque (no lock, no I/O) and returns. A writer thread drains the
+deque in batches (group commit): it wakes when ``batch_records`` records are
+waiting or ``batch_seconds`` after the last commit, serializes the batch as
+JSON lines, compresses it into one gzip member, appends that to the current
+segment and fsyncs. Segments are plain multi-member ``.jsonl.gz`` files that
+``zcat`` can read; a crash can only tear the last member, which the scanner
+detects and skips.
+
+Segments are named ``<log>-<start time>-<pid>-<n>.jsonl.gz`` under
+``AUDIT_DIR`` and rotated at ``SEGMENT_BYTES``. Every record carries ``seq``
+(per process), ``ts`` and ``type``. A record dropped because the buffer is
+full still uses up its ``seq``, so ``verify`` reports the loss as a gap;
+drops after the last stored record are followed by a ``dropped`` marker on
+close for the same reason.
+
+Usage:
+    python -m audit scan [--log api] [--type predict] [--since 2026-10-01] [--session ID]
+    python -m audit verify
+    python -m audit replay [--log api]
+"""
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+
+import metrics
+import wire
+from log import get_logger
+
+logger = get_logger("audit")
+
+AUDIT_DIR = os.environ.get("AUDIT_DIR", "audit")
+BATCH_RECORDS = 512
+BATCH_SECONDS = 0.05
+# One commit never takes more than this many records, so a backlog is written in bounded members
+MAX_BATCH_RECORDS = 8192
+SEGMENT_BYTES = 64 * 1024 * 1024
+BUFFER_CAPACITY = 100_000
+COMPRESS_LEVEL = 6
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+COMMIT_SECONDS = metrics.histogram("audit_commit_seconds", "Time to compress, write and fsync one batch", ("log",))
+BATCH_SIZE = metrics.histogram("audit_batch_records", "Records per group commit", ("log",),
+                               buckets=(1, 8, 32, 128, 512, 2048, 8192))
+RECORDS = metrics.counter("audit_records_total", "Audit records by outcome", ("log", "result"))
+
+
+class AuditLog:
+    def __init__(self, name, directory=AUDIT_DIR, batch_records=BATCH_RECORDS, batch_seconds=BATCH_SECONDS,
+                 segment_bytes=SEGMENT_BYTES, capacity=BUFFER_CAPACITY):
+        self.name = name
+        self.directory = directory
+        self.batch_records = batch_records
+        self.batch_seconds = batch_seconds
+        self.segment_bytes = segment_bytes
+        self.capacity = capacity
+
+        # deque.append and popleft are atomic, so producers and the writer need no lock
+        self._buffer = deque()
+        self._seq = itertools.count(1)
+        self._wake = threading.Event()
+        self._closing = False
+        self._overflowing = False
+        self._trailing_drops = 0
+        self._thread = None
+
+        self._started = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        self._segment = None
+        self._segment_size = 0
+        self._segment_index = 0
+        metrics.gauge(f"audit_{name}_buffered", "Audit records waiting for the writer", lambda: len(self._buffer))
+
+    def record(self, kind, **fields):
+        """Queue a record without touching the disk. Returns its ``seq``, or None if the buffer is full."""
+        seq = next(self._seq)
+        if len(self._buffer) >= self.capacity:
+            RECORDS.inc(self.name, "dropped")
+            self._trailing_drops += 1
+            if not self._overflowing:
+                self._overflowing = True
+                logger.error("Audit buffer for %s is full; dropping records until the writer catches up", self.name)
+            return None
+        self._overflowing = False
+        self._trailing_drops = 0
+
+        self._buffer.append({"seq": seq, "ts": time.time(), "type": kind, **fields})
+        if len(self._buffer) >= self.batch_records:
+            self._wake.set()
+        return seq
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name=f"audit-{self.name}", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Commit everything still buffered and stop the writer."""
+        if self._trailing_drops:
+            # Bypasses the capacity check: without a later seq the last drops would leave no gap
+            self._buffer.append({"seq": next(self._seq), "ts": time.time(), "type": "dropped", "count": self._trailing_drops})
+        self._closing = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.batch_seconds)
+            self._wake.clear()
+            closing = self._closing
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), MAX_BATCH_RECORDS))]
+                if not self._commit(batch):
+                    if closing:
+                        RECORDS.inc(self.name, "lost", amount=len(batch) + len(self._buffer))
+                        return
+                    # Put the batch back in order and retry after a pause
+                    self._buffer.extendleft(reversed(batch))
+                    time.sleep(1.0)
+                    break
+            if closing:
+                return
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        try:
+            body = b"".join(wire.dumps(record) + b"\n" for record in batch)
+            member = gzip.compress(body, COMPRESS_LEVEL, mtime=0)
+            segment = self._segment_for(len(member))
+            segment.write(member)
+            segment.flush()
+            os.fsync(segment.fileno())
+        except OSError as e:
+            logger.error("Audit commit of %d records to %s failed: %s", len(batch), self.directory, e)
+            RECORDS.inc(self.name, "failed", amount=len(batch))
+            return False
+
+        self._segment_size += len(member)
+        COMMIT_SECONDS.observe(time.perf_counter() - start, self.name)
+        BATCH_SIZE.observe(len(batch), self.name)
+        RECORDS.inc(self.name, "written", amount=len(batch))
+        return True
+
+    def _segment_for(self, size):
+        if self._segment is not None and self._segment_size and self._segment_size + size > self.segment_bytes:
+            self._segment.close()
+            self._segment = None
+        if self._segment is None:
+            self._segment_index += 1
+            path = os.path.join(self.directory, f"{self.name}-{self._started}-{os.getpid()}-{self._segment_index:05d}{SEGMENT_SUFFIX}")
+            self._segment = open(path, "ab")
+            self._segment_size = self._segment.tell()
+            _fsync_directory(self.directory)
+        return self._segment
+
+
+def _fsync_directory(directory):
+    # Makes a new segment's directory entry durable; not possible on Windows
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def install(app, name):
+    """Create the service's AuditLog, started on start-up and drained on shutdown."""
+    audit_log = AuditLog(name)
+
+    async def start_writer():
+        audit_log.start()
+
+    async def stop_writer():
+        await asyncio.to_thread(audit_log.close)
+
+    app.router.add_event_handler("startup", start_writer)
+    app.router.add_event_handler("shutdown", stop_writer)
+    return audit_log
+
+
+def segments(directory=AUDIT_DIR, name=None):
+    """Segment paths, oldest first within each log."""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+        if filename.endswith(SEGMENT_SUFFIX) and (name is None or filename.startswith(f"{name}-"))
+    ]
+
+
+def read_segment(path, errors=None):
+    """Yield the records of one segment.
+
+    Reading stops at the first damaged gzip member (a write torn by a crash);
+    a description is appended to ``errors`` when it is given.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    offset = 0
+    while offset < len(data):
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            body = decompressor.decompress(data[offset:])
+        except zlib.error as e:
+            body = None
+            problem = str(e)
+        else:
+            problem = None if decompressor.eof else "truncated member"
+        if problem is not None:
+            if errors is not None:
+                errors.append(f"{path}: {problem} at byte {offset}")
+            return
+        for line in body.splitlines():
+            yield json.loads(line)
+        offset = len(data) - len(decompressor.unused_data)
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def scan(directory=AUDIT_DIR, name=None, kind=None, since=None, until=None, session_id=None, errors=None):
+    """Yield records matching every given filter; ``since``/``until`` are epoch seconds."""
+    for path in segments(directory, name):
+        for record in read_segment(path, errors):
+            if kind is not None and record.get("type") != kind:
+                continue
+            if since is not None and record["ts"] < since:
+                continue
+            if until is not None and record["ts"] >= until:
+                continue
+            if session_id is not None and record.get("session_id") != session_id:
+                continue
+            yield record
+
+
+def verify(directory=AUDIT_DIR, name=None):
+    """Count records per segment run and report torn members and ``seq`` gaps."""
+    report = {"segments": 0, "records": 0, "errors": [], "gaps": []}
+    last_seq = {}
+    for path in segments(directory, name):
+        report["segments"] += 1
+        # Segments of one process share "<log>-<start time>-<pid>" and one seq counter
+        run = os.path.basename(path).rsplit("-", 1)[0]
+        for record in read_segment(path, report["errors"]):
+            report["records"] += 1
+            expected = last_seq.get(run, 0) + 1
+            if record["seq"] != expected:
+                report["gaps"].append(f"{run}: expected seq {expected}, found {record['seq']}")
+            last_seq[run] = record["seq"]
+    return report
+
+
+def replay(records):
+    """Re-score recorded predictions with the current knowledge base; yields the ones that changed."""
+    from app import MedicalAssistant
+
+    assistant = MedicalAssistant()
+    for record in records:
+        if record.get("type") != "predict":
+            continue
+        current = assistant.predict_disease_from_symptoms(record["symptoms"])
+        recorded = record["result"]
+        if (current.get("predicted_disease"), current.get("confidence")) != (recorded.get("predicted_disease"), recorded.get("confidence")):
+            yield {
+                "seq": record["seq"],
+                "ts": record["ts"],
+                "symptoms": record["symptoms"],
+                "recorded": {"predicted_disease": recorded.get("predicted_disease"), "confidence": recorded.get("confidence")},
+                "current": {"predicted_disease": current.get("predicted_disease"), "confidence": current.get("confidence")}
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read the audit log.")
+    parser.add_argument("command", choices=["scan", "verify", "replay"])
+    parser.add_argument("--dir", default=AUDIT_DIR)
+    parser.add_argument("--log", help="only this log, e.g. api or chat")
+    parser.add_argument("--type", help="only records of this type, e.g. predict or assessment")
+    parser.add_argument("--since", help="ISO date or time, inclusive")
+    parser.add_argument("--until", help="ISO date or time, exclusive")
+    parser.add_argument("--session", help="only this chat session")
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        report = verify(args.dir, args.log)
+        print(json.dumps(report, indent=2))
+        return 1 if report["errors"] or report["gaps"] else 0
+
+    errors = []
+    records = scan(args.dir, args.log, args.type, _parse_time(args.since), _parse_time(args.until), args.session, errors)
+    if args.command == "replay":
+        records = replay(records)
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False))
+    for error in errors:
+        print(error, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Benchmarks for the healthcare assistant services. Run modules with ``python -m benchmarks.<name>``."""
@@ -0,0 +1,52 @@
+"""Run the benchmark suite and write one machine-readable JSON report.
+
+Usage: python -m benchmarks [--out results.json] [--quick] [--skip-load]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+
+from benchmarks import chat_turn, doctor_lookup, loadgen, micro, startup
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick=False, skip_load=False):
+    scale = 0.1 if quick else 1.0
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "benchmarks": [
+            micro.run(iterations=int(2000 * scale)),
+            doctor_lookup.run(int(100000 * scale), int(2000 * scale)),
+            asyncio.run(chat_turn.run(turns=int(50 * scale) or 1, latency=0.05, concurrency=8)),
+        ]
+    }
+    if not skip_load:
+        report["benchmarks"].append(startup.run(repeat=1 if quick else 3))
+        report["benchmarks"].append(loadgen.run(concurrency=32, requests=int(2000 * scale)))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--quick", action="store_true", help="run every benchmark at a tenth of its size")
+    parser.add_argument("--skip-load", action="store_true", help="skip the start-up and HTTP load tests")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args.quick, args.skip_load), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
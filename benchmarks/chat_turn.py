@@ -0,0 +1,69 @@
+"""Per-turn latency of the chat LangGraph workflow against a stub LLM.
+
+Usage: python -m benchmarks.chat_turn [--turns 20] [--latency 0.05] [--concurrency 1]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import chat_graph
+import intent_router
+from benchmarks.stub_llm import StubChatGroq
+from pdf_store import create_pdf_store
+
+SAMPLE_MESSAGES = [
+    "I am really worried, I have a severe headache and nausea",
+    "What are the symptoms of diabetes?",
+    "Thanks, I feel a bit better today",
+    "How much water should I drink every day?",
+]
+# Not one of SAMPLE_MESSAGES, so the warm-up doesn't pre-fill the intent cache for them
+WARMUP_MESSAGE = "Hello, can you help me with a health question?"
+
+
+async def _conversation(turns, timings):
+    session = {"messages": [], "pdf_store": create_pdf_store(), "has_pdf": False}
+    for i in range(turns):
+        start = time.perf_counter()
+        await chat_graph.run_turn(session, SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)])
+        timings.append(time.perf_counter() - start)
+
+
+async def run(turns, latency, concurrency=1):
+    stub = StubChatGroq(latency=latency)
+    chat_graph.get_llm = stub.factory
+
+    # Keep the sklearn import, router training and graph compilation out of the timings
+    intent_router.preload()
+    await chat_graph.run_turn({"messages": [], "pdf_store": create_pdf_store(), "has_pdf": False}, WARMUP_MESSAGE)
+    StubChatGroq.calls = 0
+
+    timings = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_conversation(turns, timings) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    total_turns = turns * concurrency
+    timings.sort()
+    return {
+        "benchmark": "chat_turn",
+        "turns": total_turns,
+        "concurrency": concurrency,
+        "stub_latency_ms": latency * 1000,
+        "llm_calls_per_turn": StubChatGroq.calls / total_turns,
+        "p50_ms": statistics.median(timings) * 1000,
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "turns_per_sec": total_turns / elapsed
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub LLM latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=1, help="conversations run at once on one event loop")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.turns, args.latency, args.concurrency)), indent=2))
@@ -0,0 +1,85 @@
+"""Session sharding across local chat_bot_api.py nodes (cluster.py).
+
+Starts two nodes and a fake Groq server, creates sessions on node a, then
+measures ``/history`` served by the owner vs forwarded by the other node,
+and how long node a takes to hand all its sessions (some with a PDF index)
+to node b when it leaves.
+
+Usage: python -m benchmarks.cluster [--sessions 200] [--requests 2000] [--pdf-sessions 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import tempfile
+import time
+from contextlib import ExitStack
+
+import httpx
+
+from benchmarks.loadgen import free_port, run_scenario, serve
+from benchmarks.synthetic import synthetic_pdf
+
+
+def run(sessions=200, requests=2000, pdf_sessions=20, concurrency=16):
+    fake_port = free_port()
+    ports = {"a": free_port(), "b": free_port()}
+    nodes = {node_id: f"http://127.0.0.1:{port}" for node_id, port in ports.items()}
+    spec = ",".join(f"{node_id}={url}" for node_id, url in nodes.items())
+    secret = secrets.token_hex(16)
+
+    with ExitStack() as stack, tempfile.TemporaryDirectory() as directory:
+        stack.enter_context(serve("benchmarks.fake_groq:create_app", fake_port, env={"FAKE_GROQ_LATENCY": "0.01"},
+                                  ready_path="/calls", extra_args=["--factory"]))
+        for node_id, port in ports.items():
+            env = {
+                "GROQ_API_BASE": f"http://127.0.0.1:{fake_port}", "CLUSTER_NODES": spec, "NODE_ID": node_id,
+                "CLUSTER_SECRET": secret,
+                "AUDIT_DIR": os.path.join(directory, f"audit_{node_id}"),
+                "ANALYTICS_DIR": os.path.join(directory, f"analytics_{node_id}")
+            }
+            stack.enter_context(serve("chat_bot_api:app", port, env=env))
+
+        client = httpx.Client(timeout=60.0)
+        session_ids = [client.post(f"{nodes['a']}/chat", json={"message": "I have a headache and nausea"}).json()["session_id"]
+                       for _ in range(sessions)]
+        pdf_path = synthetic_pdf(os.path.join(directory, "report.pdf"), pages=20)
+        for session_id in session_ids[:pdf_sessions]:
+            with open(pdf_path, "rb") as f:
+                client.post(f"{nodes['a']}/upload-pdf", files={"file": ("report.pdf", f, "application/pdf")},
+                            data={"session_id": session_id})
+
+        async def history_request(http, rng, state):
+            return await http.get(f"/history/{rng.choice(session_ids)}")
+
+        results = [
+            asyncio.run(run_scenario("history[owner]", nodes["a"], history_request, requests, concurrency)),
+            asyncio.run(run_scenario("history[forwarded]", nodes["b"], history_request, requests, concurrency))
+        ]
+
+        start = time.perf_counter()
+        for url in nodes.values():
+            client.put(f"{url}/cluster/nodes", json={"nodes": {"b": nodes["b"]}}, headers={"x-cluster-token": secret})
+        elapsed = time.perf_counter() - start
+        held = {node_id: client.get(f"{url}/cluster").json()["sessions"] for node_id, url in nodes.items()}
+        results.append({
+            "scenario": "handoff[a leaves]",
+            "sessions": sessions,
+            "sessions_with_pdf": pdf_sessions,
+            "seconds": elapsed,
+            "sessions_per_sec": sessions / elapsed if elapsed else 0.0,
+            "sessions_held_after": held
+        })
+
+    return {"benchmark": "cluster", "concurrency": concurrency, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--pdf-sessions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sessions, args.requests, args.pdf_sessions, args.concurrency), indent=2))
@@ -0,0 +1,67 @@
+"""Latency of DoctorIndex.match with a large synthetic doctor table.
+
+Usage: python -m benchmarks.doctor_lookup [--doctors 100000] [--lookups 2000]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app import MedicalAssistant
+from doctors import SPECIALTY_CONDITIONS, DoctorIndex
+
+LANGUAGES = ["Hindi", "English", "Punjabi", "Gujarati", "Telugu", "Bengali", "Marathi", "Tamil"]
+AVAILABILITY = ["available", "busy", "offline"]
+
+
+def synthetic_doctors(count, seed=7):
+    rng = random.Random(seed)
+    specialties = list(SPECIALTY_CONDITIONS)
+    return [
+        {
+            "id": f"doc{i}",
+            "name": f"Dr. Synthetic {i}",
+            "specialty": rng.choice(specialties),
+            "experience": rng.randint(1, 35),
+            "languages": rng.sample(LANGUAGES, rng.randint(1, 3)),
+            "availability": rng.choice(AVAILABILITY),
+            "rating": round(rng.uniform(3.0, 5.0), 1)
+        }
+        for i in range(count)
+    ]
+
+
+def run(doctor_count, lookups, seed=7):
+    rng = random.Random(seed)
+    doctors = synthetic_doctors(doctor_count, seed)
+    start = time.perf_counter()
+    index = DoctorIndex(doctors, medical_knowledge=MedicalAssistant().medical_knowledge)
+    build_seconds = time.perf_counter() - start
+
+    conditions = [c for conditions in SPECIALTY_CONDITIONS.values() for c in conditions] + ["Influenza (Flu)", "High blood pressure"]
+    timings = []
+    for _ in range(lookups):
+        condition = rng.choice(conditions)
+        language = rng.choice([None] + LANGUAGES)
+        start = time.perf_counter()
+        index.match(condition, language=language, k=5)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        "benchmark": "doctor_lookup",
+        "doctors": doctor_count,
+        "lookups": lookups,
+        "build_ms": build_seconds * 1000,
+        "p50_us": statistics.median(timings) * 1e6,
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--doctors", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.doctors, args.lookups), indent=2))
@@ -0,0 +1,88 @@
+"""Deterministic local stand-in for the Groq chat completions API.
+
+Point ChatGroq at it with ``GROQ_API_BASE=http://127.0.0.1:<port>``. Replies
+depend only on the request content, and every call waits ``--latency``
+seconds (plus optional ``--jitter``) to mimic the upstream round-trip.
+
+Usage: python -m benchmarks.fake_groq [--port 9100] [--latency 0.3] [--jitter 0.0]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+
+ASSESSMENT_REPLY = """### Based on your symptoms, you may have:
+
+**Migraine**
+
+**Key symptoms identified**:
+- Severe headache
+- Nausea
+- Sensitivity to light
+
+**IMPORTANT**: This is not a medical diagnosis. Please consult a healthcare professional."""
+
+
+def create_app(latency=None, jitter=None, seed=7):
+    """Build the fake server; latency/jitter default to FAKE_GROQ_LATENCY/FAKE_GROQ_JITTER."""
+    latency = float(os.environ.get("FAKE_GROQ_LATENCY", 0.3)) if latency is None else latency
+    jitter = float(os.environ.get("FAKE_GROQ_JITTER", 0.0)) if jitter is None else jitter
+    app = FastAPI(title="Fake Groq")
+    rng = random.Random(seed)
+    app.state.calls = 0
+
+    def reply_for(messages):
+        system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        if "diagnostic assessment" in system:
+            return ASSESSMENT_REPLY
+        if '"issue"' in system:
+            return json.dumps({"issue": "Patient likely has migraine", "confidence": "medium"})
+        digest = hashlib.sha256(messages[-1].get("content", "").encode()).hexdigest()[:12]
+        return f"This is general health information (ref {digest}). Please consult a doctor for specific concerns."
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        delay = latency + (rng.uniform(0, jitter) if jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        messages = body.get("messages", [])
+        content = reply_for(messages)
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-fake-{app.state.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    @app.get("/calls")
+    async def calls():
+        return {"calls": app.state.calls}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform random delay, seconds")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.jitter), host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,187 @@
+"""Concurrent HTTP load generator for api.py and chat_bot_api.py.
+
+Each service is started with uvicorn in a subprocess. chat_bot_api.py talks
+to a local fake Groq server (benchmarks.fake_groq), so the numbers do not
+depend on the real upstream.
+
+Usage: python -m benchmarks.loadgen [--concurrency 32] [--requests 2000] [--llm-latency 0.3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SYMPTOMS = ["Fever", "Chills", "Fatigue", "Nausea", "Wheezing", "Headache", "Dizziness", "Dry cough",
+            "Increased thirst", "Chest pain", "Shortness of breath", "Vomiting"]
+DISEASES = ["Flu", "COVID-19", "Pneumonia", "Diabetes", "Migraine", "Hypertension", "Asthma", "Malaria"]
+CHAT_MESSAGES = ["I have a headache and nausea", "It gets worse in bright light", "What should I do?",
+                 "Thank you", "Is it serious?"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(target, port, env=None, ready_path="/metrics", timeout=60.0, extra_args=(), poll_interval=0.1):
+    """Run ``uvicorn <target>`` on ``port`` until the block exits."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", *extra_args],
+        cwd=REPO_ROOT, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}{ready_path}", timeout=1.0)
+                break
+            except httpx.HTTPError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"{target} did not start on port {port}")
+                time.sleep(poll_interval)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def summarize(name, latencies, statuses, elapsed):
+    latencies.sort()
+    count = len(latencies)
+    errors = sum(1 for status in statuses if status >= 400 or status == 0)
+    return {
+        "scenario": name,
+        "requests": count,
+        "errors": errors,
+        "status_codes": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+        "throughput_rps": count / elapsed if elapsed else 0.0,
+        "p50_ms": latencies[count // 2] * 1000 if count else None,
+        "p99_ms": latencies[min(count - 1, int(count * 0.99))] * 1000 if count else None,
+        "elapsed_s": elapsed
+    }
+
+
+async def run_scenario(name, base_url, make_request, total_requests, concurrency, seed=7, setup=None):
+    """Issue ``total_requests`` from ``concurrency`` workers; ``make_request(client, rng, state)`` does one call.
+
+    ``setup(client, rng, state)``, when given, prepares each worker's state before the clock starts.
+    """
+    latencies, statuses = [], []
+    remaining = [total_requests]
+    rngs = [random.Random(seed + worker_id) for worker_id in range(concurrency)]
+    states = [{} for _ in range(concurrency)]
+
+    async def worker(worker_id):
+        rng, state = rngs[worker_id], states[worker_id]
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                response = await make_request(client, rng, state)
+                statuses.append(response.status_code)
+            except httpx.HTTPError:
+                statuses.append(0)
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        if setup is not None:
+            await asyncio.gather(*(setup(client, rngs[i], states[i]) for i in range(concurrency)))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return summarize(name, latencies, statuses, elapsed)
+
+
+async def predict_request(client, rng, state):
+    return await client.post("/predict", json={"symptoms": rng.sample(SYMPTOMS, rng.randint(1, 4))})
+
+
+async def symptoms_request(client, rng, state):
+    return await client.get(f"/symptoms/{rng.choice(DISEASES)}")
+
+
+async def chat_request(client, rng, state):
+    payload = {"message": rng.choice(CHAT_MESSAGES)}
+    if "session_id" in state:
+        payload["session_id"] = state["session_id"]
+    response = await client.post("/chat", json=payload)
+    if response.status_code == 200:
+        state["session_id"] = response.json().get("session_id")
+    return response
+
+
+async def history_setup(client, rng, state):
+    # The session's first /chat waits on the LLM, so it is made before timing starts
+    response = await client.post("/chat", json={"message": rng.choice(CHAT_MESSAGES)})
+    state["session_id"] = response.json().get("session_id")
+
+
+async def history_request(client, rng, state):
+    # Delta sync: only ask for messages newer than the last one seen
+    response = await client.get(f"/history/{state['session_id']}", params={"since": state.get("last_id", 0)})
+    if response.status_code == 200:
+        state["last_id"] = response.json()["last_id"]
+    return response
+
+
+async def run_mixed(base_url, chat_requests, history_requests, concurrency):
+    """Saturate the LLM path with /chat while measuring /history alongside it."""
+    return await asyncio.gather(
+        run_scenario("chat_bot_api.chat_saturating", base_url, chat_request, chat_requests, concurrency * 4),
+        run_scenario("chat_bot_api.history_under_load", base_url, history_request, history_requests, concurrency,
+                     setup=history_setup)
+    )
+
+
+def run(concurrency=32, requests=2000, llm_latency=0.3, chat_requests=None):
+    chat_requests = chat_requests or max(concurrency * 4, requests // 10)
+    results = []
+
+    with serve("api:app", free_port()) as base_url:
+        results.append(asyncio.run(run_scenario("api.predict", base_url, predict_request, requests, concurrency)))
+        results.append(asyncio.run(run_scenario("api.symptoms", base_url, symptoms_request, requests, concurrency)))
+
+    fake_port = free_port()
+    fake_env = {"FAKE_GROQ_LATENCY": str(llm_latency)}
+    with serve("benchmarks.fake_groq:create_app", fake_port, env=fake_env, ready_path="/calls", extra_args=["--factory"]):
+        env = {"GROQ_API_BASE": f"http://127.0.0.1:{fake_port}"}
+        with serve("chat_bot_api:app", free_port(), env=env) as base_url:
+            results.append(asyncio.run(run_scenario("chat_bot_api.chat", base_url, chat_request, chat_requests, concurrency)))
+            results.append(asyncio.run(run_scenario("chat_bot_api.history", base_url, history_request, requests, concurrency,
+                                                    setup=history_setup)))
+            results.extend(asyncio.run(run_mixed(base_url, chat_requests * 2, requests, concurrency)))
+
+    return {
+        "benchmark": "loadgen",
+        "concurrency": concurrency,
+        "llm_latency_ms": llm_latency * 1000,
+        "results": results
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per cheap-endpoint scenario")
+    parser.add_argument("--chat-requests", type=int, default=None, help="requests for the /chat scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake Groq latency in seconds")
+    args = parser.parse_args()
+    print(json.dumps(run(args.concurrency, args.requests, args.llm_latency, args.chat_requests), indent=2))
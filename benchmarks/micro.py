@@ -0,0 +1,244 @@
+"""Microbenchmarks for KB scoring/lookup, PDF vector search, response serialization, trend analytics and the audit log.
+
+Usage: python -m benchmarks.micro [--diseases 500] [--symptoms 10] [--pages 200]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import WORDS, synthetic_assistant, synthetic_pdf
+
+
+def measure(name, func, inputs):
+    """Call ``func`` once per input and summarize the latencies."""
+    timings = []
+    for item in inputs:
+        start = time.perf_counter()
+        func(item)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    total = sum(timings)
+    return {
+        "name": name,
+        "iterations": len(timings),
+        "p50_us": statistics.median(timings) * 1e6,
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6,
+        "ops_per_sec": len(timings) / total if total else 0.0
+    }
+
+
+def bench_knowledge_base(diseases, symptoms_per_disease, iterations, seed=7):
+    rng = random.Random(seed)
+    assistant = synthetic_assistant(diseases, symptoms_per_disease, seed=seed)
+    names = list(assistant.medical_knowledge)
+    symptom_sets = [rng.sample(assistant.all_symptoms, 3) for _ in range(iterations)]
+    lookups = [rng.choice(names).lower() for _ in range(iterations)]
+
+    return [
+        measure(f"predict_disease_from_symptoms[{diseases}x{symptoms_per_disease}]",
+                assistant.predict_disease_from_symptoms, symptom_sets),
+        measure(f"get_disease_symptoms[{diseases}]", assistant.get_disease_symptoms, lookups),
+    ]
+
+
+def bench_localization(iterations, seed=7):
+    """Built-in KB with Hindi input and output vs English, to show lang= adds no meaningful latency."""
+    import translations
+    from app import MedicalAssistant
+
+    rng = random.Random(seed)
+    assistant = MedicalAssistant()
+    assistant.compile_languages()
+    hindi = translations.load("hi")
+    english_sets = [rng.sample(assistant.all_symptoms, 3) for _ in range(iterations)]
+    hindi_sets = [[hindi.strings.get(symptom, symptom) for symptom in symptoms] for symptoms in english_sets]
+
+    return [
+        measure("predict[en]", assistant.predict_disease_from_symptoms, english_sets),
+        measure("predict[hi input]", assistant.predict_disease_from_symptoms, hindi_sets),
+        measure("predict+localize[hi]",
+                lambda symptoms: assistant.localize(assistant.predict_disease_from_symptoms(symptoms), "hi"), hindi_sets),
+    ]
+
+
+def bench_pdf_search(pages, iterations, seed=7):
+    from pdf_store import create_pdf_store, process_pdf, retrieve_chunks, text_to_vector, vector_search
+
+    rng = random.Random(seed)
+    session = {"messages": [], "pdf_store": create_pdf_store(), "has_pdf": False}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = synthetic_pdf(os.path.join(tmp, "synthetic.pdf"), pages=pages, seed=seed)
+        start = time.perf_counter()
+        process_pdf(path, session)
+        index_seconds = time.perf_counter() - start
+
+    queries = [f"what is my {rng.choice(['glucose', 'hemoglobin', 'dose', 'blood pressure'])} {i}" for i in range(iterations)]
+    results = [
+        measure("text_to_vector", text_to_vector, queries),
+        measure(f"faiss_search[{pages} pages]",
+                lambda q: session["pdf_store"]["index"].search(np.array([text_to_vector(q)]), 3), queries),
+        measure(f"retrieve_chunks[{pages} pages]", lambda q: retrieve_chunks(q, session), queries),
+    ]
+    results.append({"name": f"process_pdf[{pages} pages]", "iterations": 1, "total_ms": index_seconds * 1000})
+
+    # Retrieval quality: queries name a page and a word from it; a hit returns that page
+    targets = [rng.randrange(pages) for _ in range(min(iterations, 500))]
+    labelled = [(f"page {page + 1} {rng.choice(session['pdf_store']['chunks'][page]['text'].split()[2:])}", page)
+                for page in targets]
+    for name, search in (("vector", lambda q: vector_search(q, session, 3)), ("hybrid", lambda q: retrieve_chunks(q, session))):
+        returned = [search(query) for query, _ in labelled]
+        results.append({
+            "name": f"retrieval_quality[{name}]",
+            "hit_rate": sum(page in ids for ids, (_, page) in zip(returned, labelled)) / len(labelled),
+            "mean_chunks": sum(len(ids) for ids in returned) / len(returned)
+        })
+    return results
+
+
+def bench_serialization(iterations, seed=7):
+    """FastAPI's default JSON path vs wire.dumps, and bytes on the wire per format."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    import wire
+    from app import MedicalAssistant
+
+    rng = random.Random(seed)
+    assistant = MedicalAssistant()
+    predictions = [assistant.predict_disease_from_symptoms(rng.sample(assistant.all_symptoms, 3)) for _ in range(iterations)]
+    history = {
+        "messages": [{"id": i, "role": "user" if i % 2 else "assistant", "content": " ".join(rng.choices(WORDS, k=60))}
+                     for i in range(1, 51)],
+        "last_id": 50,
+        "has_more": False
+    }
+
+    prediction = predictions[0]
+    trimmed = wire.select_fields(prediction, "predicted_disease,confidence,matching_symptoms,description")
+    history_body = wire.dumps(history)
+    return [
+        measure("fastapi_json[predict]", lambda p: JSONResponse(jsonable_encoder(p)).body, predictions),
+        measure("wire.dumps[predict]", wire.dumps, predictions),
+        measure("fastapi_json[history 50 msgs]", lambda h: JSONResponse(jsonable_encoder(h)).body, [history] * iterations),
+        measure("wire.dumps[history 50 msgs]", wire.dumps, [history] * iterations),
+        {
+            "name": "bytes_per_response",
+            "predict": len(wire.dumps(prediction)),
+            "predict_without_message": len(wire.dumps(trimmed)),
+            "predict_without_message_gzip": len(gzip.compress(wire.dumps(trimmed), 6)),
+            "history_50": len(history_body),
+            "history_50_gzip": len(gzip.compress(history_body, 6))
+        }
+    ]
+
+
+def bench_analytics(iterations, districts=700, seed=7):
+    """Analytics.record and trend queries after a week of skewed synthetic traffic."""
+    import analytics
+
+    rng = random.Random(seed)
+    clock = [time.time() - analytics.RETENTION_BUCKETS * analytics.BUCKET_SECONDS]
+    trends = analytics.Analytics(clock=lambda: clock[0])
+    step = analytics.RETENTION_BUCKETS * analytics.BUCKET_SECONDS / (iterations * 20)
+    symptoms = [f"symptom {i}" for i in range(400)]
+    conditions = [f"condition {i}" for i in range(120)]
+
+    def record(_):
+        clock[0] += step
+        trends.record("predict", f"district {int(rng.paretovariate(1.2)) % districts}",
+                      [symptoms[int(rng.paretovariate(1.1)) % len(symptoms)] for _ in range(3)],
+                      conditions[int(rng.paretovariate(1.1)) % len(conditions)])
+
+    measure("analytics_warmup", record, range(iterations * 19))
+    results = [measure("analytics.record", record, range(iterations))]
+    for hours in (24, 24 * 3):
+        results.append(measure(f"analytics.trends[{hours}h]",
+                               lambda district: trends.trends(district, hours),
+                               [f"district {rng.randrange(20)}" for _ in range(iterations // 10)]))
+    results.append({
+        "name": "analytics_memory",
+        "events": iterations * 20,
+        "buckets": len(trends.buckets),
+        "snapshot_bytes": len(json.dumps([bucket.to_dict() for bucket in trends.buckets.values()]))
+    })
+    return results
+
+
+def bench_audit(iterations, seed=7):
+    """AuditLog.record latency while the writer group-commits, and the resulting segment size."""
+    import audit
+    from app import MedicalAssistant
+
+    rng = random.Random(seed)
+    assistant = MedicalAssistant()
+    records = []
+    for _ in range(min(iterations, 500)):
+        symptoms = rng.sample(assistant.all_symptoms, 3)
+        records.append({"symptoms": symptoms, "district": None, "result": assistant.predict_disease_from_symptoms(symptoms)})
+    records = [records[i % len(records)] for i in range(iterations * 10)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        audit_log = audit.AuditLog("bench", directory)
+        audit_log.start()
+        start = time.perf_counter()
+        result = measure("audit.record", lambda record: audit_log.record("predict", **record), records)
+        audit_log.close()
+        elapsed = time.perf_counter() - start
+
+        written = audit.RECORDS.value("bench", "written")
+        size = sum(os.path.getsize(path) for path in audit.segments(directory, "bench"))
+        return [result, {
+            "name": "audit_commit",
+            "records_written": written,
+            "records_per_sec": written / elapsed,
+            "bytes_per_record": size / written if written else 0.0
+        }]
+
+
+def bench_profiling(diseases, symptoms_per_disease, iterations, seed=7):
+    """Scoring latency with and without a profiler sampling the process, and the cost of one sample."""
+    import profiling
+
+    rng = random.Random(seed)
+    assistant = synthetic_assistant(diseases, symptoms_per_disease, seed=seed)
+    symptom_sets = [rng.sample(assistant.all_symptoms, 3) for _ in range(iterations)]
+    name = f"predict_disease_from_symptoms[{diseases}x{symptoms_per_disease}]"
+
+    results = [measure(name, assistant.predict_disease_from_symptoms, symptom_sets)]
+    # No event loop here, so only thread stacks are sampled
+    sampler = profiling.Sampler(None, None)
+    sampler.start()
+    results.append(measure(f"{name}[profiled]", assistant.predict_disease_from_symptoms, symptom_sets))
+    sampler.stop()
+    results.append(measure("profiling.Sampler.sample", lambda _: sampler.sample(), range(iterations)))
+    return results
+
+
+def run(diseases=500, symptoms_per_disease=10, pages=200, iterations=2000):
+    return {
+        "benchmark": "micro",
+        "results": (bench_knowledge_base(diseases, symptoms_per_disease, iterations)
+                    + bench_localization(iterations)
+                    + bench_pdf_search(pages, iterations)
+                    + bench_serialization(iterations)
+                    + bench_analytics(iterations)
+                    + bench_audit(iterations)
+                    + bench_profiling(diseases, symptoms_per_disease, iterations))
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--diseases", type=int, default=500)
+    parser.add_argument("--symptoms", type=int, default=10, help="symptoms per disease")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.diseases, args.symptoms, args.pages, args.iterations), indent=2))
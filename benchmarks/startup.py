@@ -0,0 +1,91 @@
+"""Cold-start benchmark for api.py and chat_bot_api.py.
+
+For each service this reports:
+
+* ``import_ms``: the module's cumulative import time from ``python -X importtime``,
+  with its slowest direct imports, and
+* ``ready_ms`` / ``first_request_ms``: wall time from spawning uvicorn until it
+  answers ``/metrics``, and until the first real request (``/predict`` or a
+  ``/chat`` turn against the fake Groq server) has been served.
+
+Time to first request is measured with background warm-up disabled
+(``WARMUP=0``, fully lazy) and enabled.
+
+Usage: python -m benchmarks.startup [--repeat 3]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.loadgen import REPO_ROOT, free_port, serve
+
+SERVICES = {
+    "api": ("post", "/predict", {"symptoms": ["Fever", "Chills"]}),
+    "chat_bot_api": ("post", "/chat", {"message": "I have a headache and nausea"}),
+}
+
+
+def import_time(module, top=8):
+    """Cumulative import time of ``module`` in a fresh interpreter, in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((depth, name.strip(), int(cumulative_us)))
+
+    # Direct imports are the depth-1 rows between the module's own row and the previous top-level one
+    end = max(i for i, (depth, name, _) in enumerate(rows) if depth == 0 and name == module)
+    start = end
+    while start > 0 and rows[start - 1][0] != 0:
+        start -= 1
+    children = sorted((row for row in rows[start:end] if row[0] == 1), key=lambda row: -row[2])
+    return {
+        "import_ms": rows[end][2] / 1000,
+        "slowest_imports_ms": {name: cumulative / 1000 for _, name, cumulative in children[:top]}
+    }
+
+
+def first_request(service, env):
+    """Spawn ``service`` and time readiness and its first real request, in ms."""
+    method, path, payload = SERVICES[service]
+    start = time.perf_counter()
+    with serve(f"{service}:app", free_port(), env=env, poll_interval=0.01) as base_url:
+        ready = time.perf_counter()
+        response = httpx.request(method, base_url + path, json=payload, timeout=60.0)
+        done = time.perf_counter()
+    response.raise_for_status()
+    return {"ready_ms": (ready - start) * 1000, "first_request_ms": (done - start) * 1000}
+
+
+def run(repeat=3, llm_latency=0.05):
+    results = []
+    fake_port = free_port()
+    fake_env = {"FAKE_GROQ_LATENCY": str(llm_latency)}
+    with serve("benchmarks.fake_groq:create_app", fake_port, env=fake_env, ready_path="/calls", extra_args=["--factory"]):
+        for service in SERVICES:
+            result = {"service": service, **import_time(service)}
+            for mode, warmup in (("lazy", "0"), ("warmup", "1")):
+                env = {"WARMUP": warmup, "GROQ_API_BASE": f"http://127.0.0.1:{fake_port}"}
+                runs = [first_request(service, env) for _ in range(repeat)]
+                result[mode] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            results.append(result)
+
+    return {"benchmark": "startup", "repeat": repeat, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3, help="server starts per service and mode; medians are reported")
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat), indent=2))
@@ -0,0 +1,28 @@
+import asyncio
+import time
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+
+class StubChatGroq:
+    """Drop-in replacement for ChatGroq that sleeps for a fixed latency and counts calls."""
+
+    calls = 0
+
+    def __init__(self, latency=0.05, reply="This is a stub response."):
+        self.latency = latency
+        self.reply = reply
+
+    def factory(self, *args, **kwargs):
+        """Return a runnable usable wherever ``ChatGroq(model=...)`` is."""
+        return RunnableLambda(self._respond, afunc=self._arespond)
+
+    def _respond(self, prompt_value):
+        StubChatGroq.calls += 1
+        time.sleep(self.latency)
+        return AIMessage(content=self.reply)
+
+    async def _arespond(self, prompt_value):
+        StubChatGroq.calls += 1
+        await asyncio.sleep(self.latency)
+        return AIMessage(content=self.reply)
@@ -0,0 +1,75 @@
+"""Deterministic synthetic data: knowledge bases of N diseases x M symptoms and text PDFs."""
+import random
+
+WORDS = (
+    "patient blood pressure glucose hemoglobin fever cough chest pain dose tablet mg daily "
+    "insulin metformin amlodipine paracetamol report normal elevated reduced scan lung heart "
+    "kidney liver platelet count result follow up advised test value range history diagnosis"
+).split()
+
+
+def synthetic_knowledge_base(diseases, symptoms_per_disease, vocabulary=None, seed=7):
+    """Return a ``medical_knowledge``-shaped dict with ``diseases`` entries.
+
+    Symptoms are drawn from a shared vocabulary (default ``4 * symptoms_per_disease``
+    terms, at least 50) so diseases overlap the way real ones do.
+    """
+    rng = random.Random(seed)
+    vocabulary = vocabulary or max(50, 4 * symptoms_per_disease)
+    symptom_names = [f"Symptom {i:05d}" for i in range(vocabulary)]
+    return {
+        f"Disease {i:05d}": {
+            "symptoms": rng.sample(symptom_names, min(symptoms_per_disease, vocabulary)),
+            "description": f"Synthetic disease number {i}.",
+            "aliases": [f"Condition {i:05d}"]
+        }
+        for i in range(diseases)
+    }
+
+
+def synthetic_assistant(diseases, symptoms_per_disease, seed=7):
+    """A MedicalAssistant whose knowledge base is replaced by a synthetic one."""
+    from app import MedicalAssistant
+
+    return MedicalAssistant(synthetic_knowledge_base(diseases, symptoms_per_disease, seed=seed))
+
+
+def _escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def synthetic_pdf(path, pages=10, lines_per_page=30, seed=7):
+    """Write a minimal, valid text PDF that PyPDFLoader can extract. Returns ``path``."""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # pages tree, filled in once the kids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        lines = [f"Page {page + 1} " + " ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({_escape_pdf_text(line)}) Tj T*" for line in lines) + " ET"
+        stream_bytes = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream_bytes) + stream_bytes + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(output)
+    return path
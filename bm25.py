@@ -0,0 +1,79 @@
+"""Incremental in-memory BM25 keyword index.
+
+Documents are added one at a time (``add``) and can be dropped (``remove``)
+without a rebuild: postings, document lengths and the corpus totals are
+updated in place, and idf is computed at query time. The tokenizer keeps
+dotted and slashed tokens together so drug names, lab values and units such
+as ``hba1c``, ``5.6`` and ``mg/dl`` stay matchable.
+"""
+import heapq
+import math
+import re
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its me my of on or "
+    "should the this to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {doc id: term frequency}
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, doc_id, text):
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id, text):
+        """Drop ``doc_id``; ``text`` must be what it was added with."""
+        if doc_id not in self.doc_lengths:
+            return
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query, k=10, allowed=None):
+        """Return up to ``k`` ``(doc_id, score)`` pairs, best first.
+
+        ``allowed``, if given, is a predicate that doc ids must satisfy.
+        """
+        count = len(self.doc_lengths)
+        if not count:
+            return []
+        average_length = self.total_length / count or 1.0
+
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                if allowed is not None and not allowed(doc_id):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
@@ -1,20 +1,35 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Query, Request, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+import asyncio
+import importlib
+import json
 import os
-import tempfile
-import faiss
-import numpy as np
-import hashlib
 import uuid
 import shutil
-from langchain_groq import ChatGroq
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langgraph.graph import StateGraph, END
+from langchain_core.prompts import ChatPromptTemplate
+from chat_graph import get_graph, get_llm, run_turn, reset_prompt_state
+from history import append_message, last_message_id, messages_since, wait_for_messages
+from pdf_store import (
+    create_pdf_store, process_pdf, list_documents, delete_document, needs_compaction, compact,
+    preload as preload_pdf_store
+)
+from intent_router import preload as preload_intent_router
+import warmup
+from app import MedicalAssistant
+from doctors import DOCTORS, DoctorIndex
+from log import get_logger
+from admission import AdmissionController, Overloaded
+from singleflight import SingleFlight
+import analytics
+import audit
+import cluster
+import metrics
+import profiling
+import wire
 
 class Message(BaseModel):
     role: str
@@ -23,6 +38,8 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
+    # Only search these uploaded PDFs for this message
+    doc_ids: Optional[List[str]] = None
 
 class ChatResponse(BaseModel):
     message: str
@@ -31,22 +48,33 @@ class ChatResponse(BaseModel):
 class AssessmentResponse(BaseModel):
     assessment: str
     condition: str
+    specialties: List[str] = []
+    doctors: List[Dict[str, Any]] = []
+    message: Optional[str] = None
 
 class SummaryResponse(BaseModel):
     issue: str
     confidence: str
 
 os.environ["GROQ_API_KEY"] = "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"
-GROQ_MODEL = "llama3-70b-8192"
+
+logger = get_logger("chat_bot_api")
 
 sessions = {}
 
+doctor_index = DoctorIndex(DOCTORS, medical_knowledge=MedicalAssistant().medical_knowledge)
+
 PDF_DIR = "uploaded_pdfs"
 os.makedirs(PDF_DIR, exist_ok=True)
 
+# Longest /history long-poll, and how often an idle SSE stream sends a keep-alive (seconds)
+MAX_HISTORY_WAIT = 30.0
+SSE_KEEPALIVE = 15.0
+
 app = FastAPI(title="Healthcare Chatbot API", 
               description="API for healthcare conversations with PDF support",
-              version="1.0.0")
+              version="1.0.0",
+              default_response_class=wire.ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -55,81 +83,62 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+wire.install(app)
+metrics.install(app)
+metrics.gauge("chat_sessions", "Sessions held in memory", lambda: len(sessions))
+
+async def warm_llm():
+    await asyncio.to_thread(importlib.import_module, "langchain_groq")
+    get_llm()
+
+warmup.install(app, get_graph, preload_intent_router, preload_pdf_store, warm_llm)
+trends = analytics.install(app, "chat")
+audit_log = audit.install(app, "chat")
+# Inside the cluster router, so a forwarded request is profiled on the node that serves it
+profiling.install(app)
+# Session sharding across nodes when CLUSTER_NODES is set; installed last so it runs first
+node = cluster.install(app, sessions)
 
 def get_session(session_id=None):
     if not session_id:
-        session_id = str(uuid.uuid4())
+        session_id = node.new_session_id()
     
     if session_id not in sessions:
-        dimension = 100
-        index = faiss.IndexFlatL2(dimension)
-        
         sessions[session_id] = {
             "id": session_id,
             "messages": [],
-            "pdf_store": {
-                "index": index,
-                "documents": [],
-                "metadata": []
-            },
+            "next_message_id": 1,
+            "pdf_store": create_pdf_store(),
             "has_pdf": False
         }
     
     return sessions[session_id], session_id
 
-def text_to_vector(text, dimension=100):
-    hash_object = hashlib.md5(text.encode())
-    hash_hex = hash_object.hexdigest()
-    
-    vector = np.zeros(dimension)
-    for i in range(min(dimension, len(hash_hex))):
-        vector[i] = int(hash_hex[i], 16) / 16.0
-    
-    return vector
+# Duplicate requests (double taps, client retries) for the same session and
+# history share one LLM call instead of each starting their own
+chat_flight = SingleFlight("chat")
+assessment_flight = SingleFlight("assessment")
+summary_flight = SingleFlight("summary")
 
-def process_pdf(file_path, session):
-    try:
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
-        
-        for i, doc in enumerate(docs):
-            embedding = text_to_vector(doc.page_content)
-            
-            session["pdf_store"]["index"].add(np.array([embedding]))
-            session["pdf_store"]["documents"].append(doc)
-            session["pdf_store"]["metadata"].append({
-                "page": i+1,
-                "total_pages": len(docs)
-            })
-        
-        session["has_pdf"] = True
-        return len(docs)
-    except Exception as e:
-        print(f"Error processing PDF: {e}")
-        return 0
+# Bounds concurrent Groq calls and runs one turn per session at a time; the
+# patient-facing calls go ahead of the sidebar summary when there's a queue
+llm_admission = AdmissionController("llm")
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
 
-def search_pdf(query, session, top_k=3):
-    if not session["has_pdf"]:
-        return "No PDF has been uploaded yet."
-    
-    query_vector = text_to_vector(query)
-    D, I = session["pdf_store"]["index"].search(np.array([query_vector]), top_k)
-    
-    results = []
-    for idx in I[0]:
-        if idx < len(session["pdf_store"]["documents"]):
-            doc = session["pdf_store"]["documents"][idx]
-            metadata = session["pdf_store"]["metadata"][idx]
-            page_info = f"[Page {metadata['page']}/{metadata['total_pages']}]"
-            results.append(f"{page_info} {doc.page_content}")
-    
-    return "\n\n".join(results)
+async def admitted(session_id, priority, fn):
+    async with llm_admission.turn(session_id, priority):
+        return await fn()
+
+def history_watermark(session):
+    """Number of assistant replies so far; it only moves once a turn has completed."""
+    return sum(1 for msg in session["messages"] if msg["role"] == "assistant")
 
-def generate_assessment(messages):
+async def generate_assessment(messages):
     user_inputs = [msg["content"] for msg in messages if msg["role"] == "user"]
     all_content = "\n".join(user_inputs)
     
-    llm = ChatGroq(model=GROQ_MODEL)
+    llm = get_llm()
     prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a healthcare assistant providing a potential diagnostic assessment.
         Based on the conversation, identify the most likely condition that matches the symptoms.
@@ -150,30 +159,22 @@ def generate_assessment(messages):
     ])
     
     chain = prompt | llm | StrOutputParser()
-    assessment = chain.invoke({"conversation": all_content})
+    with metrics.span("llm_assessment"):
+        assessment = await chain.ainvoke({"conversation": all_content})
     
     condition = "Medical condition"
     for line in assessment.split("\n"):
-        if line.strip() and not line.startswith("**") and not line.startswith("#") and not line.startswith("-"):
-            condition = line.strip()
+        line = line.strip()
+        # The prompt asks for the condition as a bold line of its own: **[Condition name]**
+        if line.startswith("**") and line.endswith("**") and not line.rstrip("*").endswith(":"):
+            condition = line.strip("*[] ")
+            break
+        if line and not line.startswith("**") and not line.startswith("#") and not line.startswith("-"):
+            condition = line
             break
     
     return assessment, condition
 
-def create_chat_chain(system_message, pdf_context=None):
-    if pdf_context:
-        system_message = f"{system_message}\n\nUse the following PDF context:\n{pdf_context}"
-    
-    llm = ChatGroq(model=GROQ_MODEL)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_message),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("human", "{message}")
-    ])
-    
-    chain = prompt | llm | StrOutputParser()
-    return chain
-
 @app.get("/")
 async def root():
     return {"message": "Healthcare Chatbot API is running"}
@@ -182,32 +183,18 @@ async def root():
 async def chat(request: ChatRequest):
     session, session_id = get_session(request.session_id)
     
-    session["messages"].append({"role": "user", "content": request.message})
-    
-    if session["has_pdf"] and any(kw in request.message.lower() for kw in ["pdf", "document", "file", "read", "what does it say"]):
-        pdf_context = search_pdf(request.message, session)
-        system_message = "You are a helpful healthcare assistant analyzing a medical document."
-        chain = create_chat_chain(system_message, pdf_context)
-    else:
-        system_message = "You are a helpful healthcare assistant. Provide clear medical information but always advise consulting a doctor for specific concerns."
-        chain = create_chat_chain(system_message)
-    
-    chat_history = []
-    for msg in session["messages"][:-1]:
-        if msg["role"] == "user":
-            chat_history.append(HumanMessage(content=msg["content"]))
-        else:
-            chat_history.append(AIMessage(content=msg["content"]))
-    
     try:
-        response = chain.invoke({
-            "chat_history": chat_history,
-            "message": request.message
-        })
-        
-        session["messages"].append({"role": "assistant", "content": response})
-        
+        if request.session_id:
+            # A retried or double-sent message joins the turn already running for it
+            key = (session_id, history_watermark(session), request.message, tuple(request.doc_ids or ()))
+            response = await chat_flight.do(key, lambda: admitted(
+                session_id, PRIORITY_INTERACTIVE, lambda: run_turn(session, request.message, request.doc_ids)))
+        else:
+            response = await admitted(
+                session_id, PRIORITY_INTERACTIVE, lambda: run_turn(session, request.message, request.doc_ids))
         return {"message": response, "session_id": session_id}
+    except Overloaded:
+        raise
     except Exception as e:
         return HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -216,57 +203,161 @@ async def upload_pdf(file: UploadFile = File(...), session_id: Optional[str] = F
     session, session_id = get_session(session_id)
     
     try:
-        file_path = os.path.join(PDF_DIR, f"{session_id}_{file.filename}")
+        doc_id = uuid.uuid4().hex
+        file_path = os.path.join(PDF_DIR, f"{session_id}_{doc_id}_{file.filename}")
         with open(file_path, "wb") as f:
             shutil.copyfileobj(file.file, f)
         
-        page_count = process_pdf(file_path, session)
+        page_count = await asyncio.to_thread(process_pdf, file_path, session, doc_id, file.filename)
         
         welcome_message = f"📄 I've processed your PDF: {file.filename} ({page_count} pages). You can now ask me questions about this document!"
         
-        session["messages"].append({"role": "assistant", "content": welcome_message})
+        append_message(session, "assistant", welcome_message)
         
         return {
             "message": welcome_message,
             "session_id": session_id,
+            "doc_id": doc_id,
             "page_count": page_count
         }
     except Exception as e:
         return HTTPException(status_code=500, detail=f"Error uploading PDF: {str(e)}")
 
-@app.post("/assessment")
-async def get_assessment(session_id: str):
+@app.get("/pdf")
+async def get_documents(session_id: str):
+    session, _ = get_session(session_id)
+    return {"documents": list_documents(session)}
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+@app.delete("/pdf/{doc_id}")
+async def delete_pdf(doc_id: str, session_id: str, background_tasks: BackgroundTasks):
+    session, _ = get_session(session_id)
+    
+    # Waits on the store lock, which a running compaction holds
+    document = await asyncio.to_thread(delete_document, session, doc_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    background_tasks.add_task(remove_file, document["path"])
+    if needs_compaction(session["pdf_store"]):
+        background_tasks.add_task(compact, session["pdf_store"])
+    
+    return {"message": f"Removed {document['name']}", "doc_id": doc_id, "documents": list_documents(session)}
+
+async def build_assessment(session, district=None):
+    assessment, condition = await generate_assessment(session["messages"])
+    trends.record("assessment", district, condition=condition)
+    matches = doctor_index.match(condition)
+    
+    doctor_lines = "".join(
+        f"- **{doctor['name']}** ({doctor['specialty']}, {doctor['experience']} yrs, ⭐ {doctor['rating']}) - {doctor['availability']}\n"
+        for doctor in matches["doctors"]
+    )
+    assessment_message = (
+        "# 🏥 YOUR FINAL ASSESSMENT\n\n"
+        f"{assessment}\n\n"
+        "---\n\n"
+        f"### Doctors who can help with `{condition}`\n\n"
+        f"{doctor_lines or 'No matching doctor is available right now. Please visit your nearest health centre.'}"
+    )
+    
+    message = append_message(session, "assistant", assessment_message)
+    audit_log.record("assessment", session_id=session["id"], message_id=message["id"], district=district,
+                     condition=condition, assessment=assessment, specialties=matches["specialties"],
+                     doctors=[doctor["id"] for doctor in matches["doctors"]])
+    
+    return {
+        "assessment": assessment,
+        "condition": condition,
+        "specialties": matches["specialties"],
+        "doctors": matches["doctors"],
+        "message": assessment_message
+    }
+
+@app.post("/assessment", responses={200: {"model": AssessmentResponse}})
+async def get_assessment(session_id: str, request: Request, fields: Optional[str] = None, district: Optional[str] = None):
     session, _ = get_session(session_id)
     
     if len(session["messages"]) < 2:
         return HTTPException(status_code=400, detail="Not enough conversation history for assessment")
     
     try:
-        assessment, condition = generate_assessment(session["messages"])
-        
-        assessment_message = (
-            "# 🏥 YOUR FINAL ASSESSMENT\n\n"
-            f"{assessment}\n\n"
-            "---\n\n"
-            f"### Copy this condition to find a doctor: `{condition}`\n\n"
-            "1. Copy the condition above\n"
-            "2. Paste the condition in the search box to find a specialist"
-        )
-        
-        session["messages"].append({"role": "assistant", "content": assessment_message})
-        
-        return {
-            "assessment": assessment,
-            "condition": condition,
-            "message": assessment_message
-        }
+        # district is recorded in analytics and the audit log, so callers only share a result for the same one
+        key = (session_id, history_watermark(session), district)
+        result = await assessment_flight.do(key, lambda: admitted(
+            session_id, PRIORITY_INTERACTIVE, lambda: build_assessment(session, district)))
+        return wire.respond(request, result, fields)
+    except (Overloaded, HTTPException):
+        raise
     except Exception as e:
         return HTTPException(status_code=500, detail=f"Error generating assessment: {str(e)}")
 
+@app.get("/analytics")
+async def get_analytics(request: Request, district: Optional[str] = None,
+                        hours: int = Query(24, ge=1, le=analytics.MAX_WINDOW_HOURS), k: int = Query(10, ge=1, le=100),
+                        condition: Optional[str] = None, fields: Optional[str] = None):
+    """Top and rising assessed conditions over the last ``hours``; ``condition`` adds its hourly series."""
+    result = trends.trends(district, hours, k)
+    if condition:
+        result["series"] = trends.series("condition", condition, district, hours)
+    return wire.respond(request, result, fields)
+
+@app.get("/doctors")
+async def find_doctors(condition: str, language: Optional[str] = None, availability: Optional[str] = None, k: int = 3):
+    return doctor_index.match(condition, language=language, availability=availability, k=k)
+
 @app.get("/history/{session_id}")
-async def get_history(session_id: str):
+async def get_history(session_id: str, request: Request, since: int = 0, limit: Optional[int] = Query(None, ge=1), wait: float = 0):
+    """Messages after id ``since``; with ``wait`` > 0, long-polls up to that many seconds for new ones."""
+    session, _ = get_session(session_id)
+    
+    if wait > 0:
+        await wait_for_messages(session, since, min(wait, MAX_HISTORY_WAIT))
+    
+    messages = messages_since(session, since, limit)
+    last_id = last_message_id(session)
+    return wire.respond(request, {
+        "messages": messages,
+        "last_id": last_id,
+        "has_more": bool(messages) and messages[-1]["id"] < last_id
+    })
+
+@app.get("/history/{session_id}/stream")
+async def stream_history(session_id: str, request: Request, since: int = 0):
+    """Server-sent events: one ``message`` event per new message, resumable via ``Last-Event-ID``."""
     session, _ = get_session(session_id)
-    return {"messages": session["messages"]}
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    
+    async def events():
+        last_id = since
+        # A session handed to another node ends the stream; the client reconnects to the new owner
+        while not await request.is_disconnected() and not session.get("moved_to"):
+            for message in messages_since(session, last_id):
+                last_id = message["id"]
+                yield f"id: {last_id}\nevent: message\ndata: {json.dumps(message)}\n\n"
+            if not await wait_for_messages(session, last_id, SSE_KEEPALIVE):
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/prompt-stats/{session_id}")
+async def get_prompt_stats(session_id: str):
+    session, _ = get_session(session_id)
+    stats = session.get("prompt_stats", [])
+    return {
+        "turns": stats,
+        "total_prompt_tokens": sum(turn["prompt_tokens"] for turn in stats),
+        "total_new_prompt_tokens": sum(turn["new_prompt_tokens"] for turn in stats),
+        "total_baseline_prompt_tokens": sum(turn["baseline_prompt_tokens"] for turn in stats)
+    }
 
 @app.post("/reset/{session_id}")
 async def reset_session(session_id: str):
@@ -276,11 +367,46 @@ async def reset_session(session_id: str):
     has_pdf = session["has_pdf"]
     
     session["messages"] = []
+    reset_prompt_state(session)
     session["pdf_store"] = pdf_store
     session["has_pdf"] = has_pdf
     
     return {"message": "Session reset successfully"}
 
+async def summarize_conversation(session):
+    user_inputs = [msg["content"] for msg in session["messages"] if msg["role"] == "user"]
+    all_content = "\n".join(user_inputs)
+    
+    llm = get_llm()
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", """You are a healthcare assistant. 
+        Analyze the conversation and identify the most likely medical issue or condition in ONE SHORT SENTENCE.
+        Also provide a confidence level (high, medium, or low) based on the clarity of symptoms.
+        Format your response exactly like this:
+        
+        {"issue": "Patient likely has [condition]", "confidence": "[high/medium/low]"}
+        
+        Be concise and direct. Do not include explanations or disclaimers in the response.
+        """),
+        ("human", "{conversation}")
+    ])
+    
+    chain = prompt | llm | StrOutputParser()
+    with metrics.span("llm_summary"):
+        result = await chain.ainvoke({"conversation": all_content})
+    
+    import json
+    try:
+        parsed = json.loads(result)
+        issue = parsed.get("issue", "Unable to determine specific medical issue")
+        confidence = parsed.get("confidence", "low")
+    except Exception as json_error:
+        logger.warning("JSON parsing error: %s, Response was: %s", json_error, result)
+        issue = "Unable to determine specific medical issue"
+        confidence = "low"
+    
+    return SummaryResponse(issue=issue, confidence=confidence)
+
 @app.post("/summary/{session_id}", response_model=SummaryResponse)
 async def get_summary(session_id: str):
     session, _ = get_session(session_id)
@@ -289,37 +415,11 @@ async def get_summary(session_id: str):
         return HTTPException(status_code=400, detail="Not enough conversation history for summary")
     
     try:
-        user_inputs = [msg["content"] for msg in session["messages"] if msg["role"] == "user"]
-        all_content = "\n".join(user_inputs)
-        
-        llm = ChatGroq(model=GROQ_MODEL)
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a healthcare assistant. 
-            Analyze the conversation and identify the most likely medical issue or condition in ONE SHORT SENTENCE.
-            Also provide a confidence level (high, medium, or low) based on the clarity of symptoms.
-            Format your response exactly like this:
-            
-            {"issue": "Patient likely has [condition]", "confidence": "[high/medium/low]"}
-            
-            Be concise and direct. Do not include explanations or disclaimers in the response.
-            """),
-            ("human", "{conversation}")
-        ])
-        
-        chain = prompt | llm | StrOutputParser()
-        result = chain.invoke({"conversation": all_content})
-        
-        import json
-        try:
-            parsed = json.loads(result)
-            issue = parsed.get("issue", "Unable to determine specific medical issue")
-            confidence = parsed.get("confidence", "low")
-        except Exception as json_error:
-            print(f"JSON parsing error: {json_error}, Response was: {result}")
-            issue = "Unable to determine specific medical issue"
-            confidence = "low"
-        
-        return SummaryResponse(issue=issue, confidence=confidence)
+        key = (session_id, history_watermark(session))
+        return await summary_flight.do(key, lambda: admitted(
+            session_id, PRIORITY_BACKGROUND, lambda: summarize_conversation(session)))
+    except Overloaded:
+        raise
     except Exception as e:
         return SummaryResponse(
             issue="Error analyzing conversation", 
@@ -0,0 +1,295 @@
+"""LangGraph chat workflow shared by the Streamlit app and the FastAPI service.
+
+The graph is compiled on first use (``get_graph``) and has no Streamlit
+dependency: everything a turn needs (history, PDF store) travels in
+``AgentState``. Nodes are async so many conversations can share one event
+loop. langgraph and langchain_groq are imported lazily to keep service
+start-up fast.
+"""
+import asyncio
+import weakref
+from functools import lru_cache
+from typing import TypedDict, Dict, Any, List, Optional
+
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
+
+import metrics
+from history import append_message
+from intent_router import is_loaded as router_is_loaded, route_message
+from log import get_logger
+from pdf_store import retrieve_context
+from sentiment import classify_sentiment
+
+logger = get_logger("chat_graph")
+
+GROQ_MODEL = "llama3-70b-8192"
+# GROQ_MODEL's context window, less room for the reply; prompts are trimmed to fit
+CONTEXT_WINDOW_TOKENS = 8192
+REPLY_TOKENS = 1024
+PROMPT_TOKEN_BUDGET = CONTEXT_WINDOW_TOKENS - REPLY_TOKENS
+
+# One static system prompt for every agent so the start of each request is
+# byte-identical across turns and the provider can reuse its prefix cache.
+# Anything that varies goes after the history, never in front of it.
+SYSTEM_PROMPT = (
+    "You are a helpful healthcare assistant providing clear, general health and medical information. "
+    "Consider the entire conversation history when responding. "
+    "IMPORTANT: Always advise consulting a doctor for specific medical concerns. "
+    "When document context from the user's uploaded medical PDFs is provided, use it to answer questions "
+    "about the document, and if it suggests a serious condition, strongly advise seeing a doctor."
+)
+
+CONTEXT_TEMPLATE = "Document context from the user's uploaded PDF:\n{context}"
+# Pinned contexts kept per session; the oldest is dropped beyond this
+MAX_PINNED_CONTEXTS = 4
+
+# One client per event loop: building a ChatGroq costs ~80 ms of CPU (SSL
+# setup), and its async connection pool can't be shared across loops
+_llms = weakref.WeakKeyDictionary()
+
+
+def get_llm():
+    """Return the ChatGroq client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    llm = _llms.get(loop)
+    if llm is None:
+        from langchain_groq import ChatGroq
+
+        llm = _llms[loop] = ChatGroq(model=GROQ_MODEL)
+    return llm
+
+
+class AgentState(TypedDict):
+    messages: List[BaseMessage]
+    sentiment: Optional[str]
+    task_type: Optional[str]
+    session: Dict[str, Any]
+    # Restrict PDF retrieval to these uploaded documents (None searches all of them)
+    doc_ids: Optional[List[str]]
+
+
+def to_langchain_messages(messages):
+    """Convert ``{"role", "content"}`` dicts into LangChain message objects."""
+    return [
+        HumanMessage(content=msg["content"])
+        if msg["role"] == "user"
+        else AIMessage(content=msg["content"])
+        for msg in messages
+    ]
+
+
+async def sentiment_analyzer(state: AgentState) -> Dict[str, Any]:
+    """Analyze the sentiment of the user's message with the local lexicon classifier."""
+    return {"sentiment": classify_sentiment(state['messages'][-1].content)}
+
+
+async def task_router(state: AgentState) -> Dict[str, Any]:
+    """Route the task to the appropriate agent."""
+    session = state.get('session') or {}
+    args = (state['messages'][-1].content, session.get('has_pdf', False))
+    if not router_is_loaded():
+        # Without a warm-up the first message imports scikit-learn and trains the router; keep that off the event loop
+        return {"task_type": await asyncio.to_thread(route_message, *args)}
+    return {"task_type": route_message(*args)}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+def pin_context(session: Dict[str, Any], query: str, doc_ids: Optional[List[str]] = None) -> bool:
+    """Retrieve PDF context for the current turn and record it in the transcript if it is new.
+
+    Contexts are anchored at the position of the user message they were
+    retrieved for, so once sent they become part of the stable history prefix
+    instead of being re-sent in the system prompt every turn. A chunk set
+    that is already pinned is not pinned again, and only the last
+    ``MAX_PINNED_CONTEXTS`` are kept. Returns whether the rendered context
+    came from the per-session retrieval cache.
+    """
+    chunk_ids, context, cache_hit = retrieve_context(query, session, doc_ids=doc_ids)
+    store = session["pdf_store"]
+    # delete_document() filters the log under the store lock; chunks it
+    # removed since retrieval are not pinned
+    with store["lock"]:
+        if chunk_ids and all(chunk_id in store["chunks"] for chunk_id in chunk_ids):
+            log = session.setdefault("context_log", [])
+            if all(pinned_ids != chunk_ids for _, _, pinned_ids in log):
+                log.append((len(session["messages"]) - 1, context, chunk_ids))
+                del log[:-MAX_PINNED_CONTEXTS]
+            session["context_chunk_ids"] = chunk_ids
+    return cache_hit
+
+
+def _contexts_within_budget(session: Dict[str, Any], messages: List[BaseMessage]) -> List[tuple]:
+    """Pinned contexts that fit in PROMPT_TOKEN_BUDGET next to the history, dropping the oldest first.
+
+    The current turn's context is the last one dropped.
+    """
+    entries = list(session.get("context_log", []))
+    current = session.get("context_chunk_ids")
+    drop_order = [entry for entry in entries if entry[2] != current] + [entry for entry in entries if entry[2] == current]
+    total = estimate_tokens(SYSTEM_PROMPT) + sum(estimate_tokens(message.content) for message in messages)
+    total += sum(estimate_tokens(CONTEXT_TEMPLATE.format(context=entry[1])) for entry in entries)
+    while drop_order and total > PROMPT_TOKEN_BUDGET:
+        entry = drop_order.pop(0)
+        entries.remove(entry)
+        total -= estimate_tokens(CONTEXT_TEMPLATE.format(context=entry[1]))
+    return entries
+
+
+def build_prompt(session: Dict[str, Any], messages: List[BaseMessage], agent_type: str = "pdf") -> List[BaseMessage]:
+    """Assemble [static system prompt] + history (with pinned contexts on pdf turns) + current message.
+
+    Pinned contexts are only included while the prompt stays within PROMPT_TOKEN_BUDGET.
+    """
+    contexts = {}
+    if agent_type == "pdf":
+        for position, context, _ in _contexts_within_budget(session, messages):
+            contexts.setdefault(position, []).append(SystemMessage(content=CONTEXT_TEMPLATE.format(context=context)))
+
+    prompt = [SystemMessage(content=SYSTEM_PROMPT)]
+    for position, message in enumerate(messages):
+        prompt.extend(contexts.get(position, ()))
+        prompt.append(message)
+    return prompt
+
+
+def record_prompt_stats(session: Dict[str, Any], prompt: List[BaseMessage], baseline_tokens: int, cache_hit: bool):
+    """Track prompt tokens per turn and how much of the prompt repeats the previous turn's prefix."""
+    serialized = [(message.type, message.content) for message in prompt]
+    previous = session.get("last_prompt", [])
+
+    reused_tokens = 0
+    for current, before in zip(serialized, previous):
+        if current != before:
+            break
+        reused_tokens += estimate_tokens(current[1])
+
+    prompt_tokens = sum(estimate_tokens(content) for _, content in serialized)
+    stats = session.setdefault("prompt_stats", [])
+    stats.append({
+        "turn": len(stats) + 1,
+        "prompt_tokens": prompt_tokens,
+        "prefix_reused_tokens": reused_tokens,
+        "new_prompt_tokens": prompt_tokens - reused_tokens,
+        "baseline_prompt_tokens": baseline_tokens,
+        "retrieval_cache_hit": cache_hit
+    })
+    session["last_prompt"] = serialized
+
+
+def baseline_prompt_tokens(agent_type: str, messages: List[BaseMessage], pdf_context: str) -> int:
+    """Tokens the previous prompt layout would have sent: per-agent system message with the
+    PDF context re-rendered into it every turn, followed by the full history."""
+    system_message = SYSTEM_PROMPT + (pdf_context if agent_type == "pdf" else "")
+    return estimate_tokens(system_message) + sum(estimate_tokens(message.content) for message in messages)
+
+
+def create_memory_aware_agent(agent_type: str):
+    """Create a memory-aware agent for different types of queries."""
+    async def agent_func(state: AgentState) -> Dict[str, Any]:
+        session = state['session']
+        try:
+            llm = get_llm()
+            query = state['messages'][-1].content
+
+            cache_hit = False
+            if agent_type == "pdf":
+                # Faiss search is CPU-bound; keep it off the event loop
+                cache_hit = await asyncio.to_thread(pin_context, session, query, state.get('doc_ids'))
+
+            prompt = build_prompt(session, state['messages'], agent_type)
+            pdf_context = ""
+            if agent_type == "pdf":
+                pdf_context = next((context for _, context, chunk_ids in session.get("context_log", [])
+                                    if chunk_ids == session.get("context_chunk_ids")), "")
+            record_prompt_stats(session, prompt, baseline_prompt_tokens(agent_type, state['messages'], pdf_context), cache_hit)
+
+            with metrics.span("llm_chat"):
+                response = (await llm.ainvoke(prompt)).content
+
+            # Add context-specific warnings
+            if agent_type == "medical" and state.get('sentiment') == 'negative':
+                response += "\n\nI sense you're worried. Please remember that while I can provide general information, it's crucial to consult a healthcare professional for personalized medical advice."
+
+            if agent_type == "pdf" and any(word in response.lower() for word in ["serious", "critical", "urgent", "immediate attention"]):
+                response += "\n\n⚠️ IMPORTANT: The information suggests a potentially serious medical condition. Please consult a healthcare professional immediately."
+
+        except Exception as e:
+            logger.error("%s Agent Error: %s", agent_type.capitalize(), e)
+            response = f"I'm sorry, but I encountered an error processing your {agent_type} query."
+
+        return {"messages": state['messages'] + [AIMessage(content=response)]}
+
+    return agent_func
+
+
+def reset_prompt_state(session: Dict[str, Any]):
+    """Forget pinned contexts and prompt stats when a session's history is cleared."""
+    for key in ("context_log", "context_chunk_ids", "last_prompt", "prompt_stats"):
+        session.pop(key, None)
+
+
+def restore_prompt_state(session: Dict[str, Any]):
+    """Turn the prompt state of a session loaded from JSON back into the tuples compared above."""
+    if "context_log" in session:
+        session["context_log"] = [(position, context, tuple(chunk_ids)) for position, context, chunk_ids in session["context_log"]]
+    if "context_chunk_ids" in session:
+        session["context_chunk_ids"] = tuple(session["context_chunk_ids"])
+    if "last_prompt" in session:
+        session["last_prompt"] = [tuple(entry) for entry in session["last_prompt"]]
+
+
+def build_workflow():
+    from langgraph.graph import StateGraph, START, END
+
+    workflow = StateGraph(AgentState)
+
+    workflow.add_node("sentiment_analyzer", sentiment_analyzer)
+    workflow.add_node("task_router", task_router)
+    workflow.add_node("medical_query_agent", create_memory_aware_agent("medical"))
+    workflow.add_node("pdf_agent", create_memory_aware_agent("pdf"))
+    workflow.add_node("general_agent", create_memory_aware_agent("general"))
+
+    # Sentiment and routing only read the last message, so they run in the
+    # same step; the chosen agent starts once both have written their keys.
+    workflow.add_edge(START, "sentiment_analyzer")
+    workflow.add_edge(START, "task_router")
+    workflow.add_conditional_edges(
+        "task_router",
+        lambda state: state["task_type"],
+        {
+            "medical_query_agent": "medical_query_agent",
+            "pdf_agent": "pdf_agent",
+            "general_agent": "general_agent"
+        }
+    )
+    workflow.add_edge("medical_query_agent", END)
+    workflow.add_edge("pdf_agent", END)
+    workflow.add_edge("general_agent", END)
+
+    return workflow
+
+
+@lru_cache(maxsize=1)
+def get_graph():
+    return build_workflow().compile()
+
+
+async def run_turn(session: Dict[str, Any], message: str, doc_ids: Optional[List[str]] = None) -> str:
+    """Append a user message to the session, run the graph and return the reply."""
+    append_message(session, "user", message)
+
+    result = await get_graph().ainvoke({
+        "messages": to_langchain_messages(session["messages"]),
+        "sentiment": None,
+        "task_type": None,
+        "doc_ids": doc_ids,
+        "session": session
+    })
+    response = result['messages'][-1].content
+
+    append_message(session, "assistant", response)
+    return response
@@ -0,0 +1,499 @@
+"""Consistent-hash session sharding for running chat_bot_api.py on several nodes.
+
+Sessions (history, prompt state, PDF indexes) live in one process's memory,
+so every request for a session has to reach the node that holds it:
+
+* ``CLUSTER_NODES`` lists the nodes as ``id=url`` pairs and ``NODE_ID`` names
+  this one. Each node id gets ``VIRTUAL_NODES`` points on a hash ring and a
+  session belongs to the first point at or after the hash of its id.
+* ``SessionRouter`` (installed as the outermost middleware) finds the session
+  id of a request in its path, query or body. A request for a session held
+  elsewhere is proxied, streaming, to the owner with ``X-Cluster-Forwarded``
+  set; forwarded requests are always served where they land, so a
+  disagreement about membership can't bounce a request around.
+* New session ids are drawn until one hashes to this node, so creating a
+  session never needs a hop.
+* ``PUT /cluster/nodes`` changes membership. Every node then hands the
+  sessions it no longer owns to their new owner (``export_session``: JSON
+  history and prompt state, the Faiss index as serialized bytes; the lock and
+  caches are rebuilt on arrival). Until that finishes, an owner that is asked
+  for a session it doesn't have yet pulls it from the previous owner.
+
+Without ``CLUSTER_NODES`` the router is not installed and nothing changes.
+With it, ``CLUSTER_SECRET`` is required: internal calls and forwarded
+requests must carry it as ``X-Cluster-Token``, since they move patient
+histories between nodes.
+
+Several local nodes for testing (with ``CLUSTER_SECRET`` exported):
+    python -m cluster launch --nodes 3 --base-port 8101
+    python -m cluster set-nodes a=http://127.0.0.1:8101,b=http://127.0.0.1:8102
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from bisect import bisect_left
+from urllib.parse import parse_qs
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from starlette.routing import Match
+
+import metrics
+import wire
+from chat_graph import restore_prompt_state
+from history import notify
+from log import get_logger
+from pdf_store import export_store, import_store
+from singleflight import SingleFlight
+
+logger = get_logger("cluster")
+
+VIRTUAL_NODES = 64
+FORWARDED_HEADER = "x-cluster-forwarded"
+TOKEN_HEADER = "x-cluster-token"
+# Longest a handoff waits for a session's in-flight requests to finish (seconds)
+HANDOFF_WAIT = 30.0
+# How long after its own handoffs a node keeps asking the previous owner for missing sessions
+REBALANCE_GRACE = 60.0
+FORWARD_TIMEOUT = 120.0
+
+_MULTIPART_SESSION_RE = re.compile(rb'name="session_id"\r\n(?:[^\r\n]+\r\n)*\r\n([^\r\n]*)\r\n')
+
+FORWARDED = metrics.counter("cluster_forwarded_total", "Requests proxied to the owning node", ("node", "result"))
+HANDOFFS = metrics.counter("cluster_handoffs_total", "Sessions moved between nodes", ("direction", "result"))
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+def parse_nodes(spec):
+    """``"a=http://host:8101,b=http://host:8102"`` -> ``{"a": "http://host:8101", ...}``"""
+    nodes = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        node_id, _, url = item.partition("=")
+        if not url:
+            raise ValueError(f"Expected id=url in CLUSTER_NODES, got {item!r}")
+        nodes[node_id.strip()] = url.strip().rstrip("/")
+    return nodes
+
+
+class HashRing:
+    def __init__(self, nodes, vnodes=VIRTUAL_NODES):
+        self.nodes = dict(nodes)
+        points = sorted((_hash(f"{node_id}#{i}"), node_id) for node_id in self.nodes for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node_id for _, node_id in points]
+
+    def owner(self, key):
+        if not self._owners:
+            return None
+        position = bisect_left(self._hashes, _hash(key))
+        return self._owners[position % len(self._owners)]
+
+
+def export_session(session):
+    """A JSON-serializable copy of a session for another node."""
+    data = {key: value for key, value in session.items() if key != "pdf_store"}
+    data["pdf_store"] = export_store(session["pdf_store"])
+    return data
+
+
+def import_session(data):
+    session = dict(data)
+    session["pdf_store"] = import_store(data["pdf_store"])
+    restore_prompt_state(session)
+    return session
+
+
+class Cluster:
+    def __init__(self, sessions, node_id=None, nodes=None, secret=None):
+        self.sessions = sessions
+        self.node_id = node_id
+        self.ring = HashRing(nodes or {})
+        self.previous_ring = None
+        self.previous_until = 0.0
+        self.secret = secret
+        self.moving = {}  # session id -> Event set when its handoff is over
+        self.active = {}  # session id -> requests changing it right now
+        self._pulls = SingleFlight("handoff")
+        self._client = None
+
+    @classmethod
+    def from_env(cls, sessions):
+        nodes = parse_nodes(os.environ.get("CLUSTER_NODES", ""))
+        node_id = os.environ.get("NODE_ID")
+        if nodes and node_id not in nodes:
+            # A joining node starts with the current members and forwards everything until added
+            logger.warning("NODE_ID %r is not one of CLUSTER_NODES %s; not owning any sessions", node_id, sorted(nodes))
+        secret = os.environ.get("CLUSTER_SECRET")
+        if nodes and not secret:
+            raise RuntimeError("CLUSTER_NODES is set but CLUSTER_SECRET is not; refusing to serve /cluster unauthenticated")
+        return cls(sessions, node_id, nodes, secret)
+
+    @property
+    def enabled(self):
+        return bool(self.ring.nodes)
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(FORWARD_TIMEOUT, connect=2.0))
+        return self._client
+
+    def _internal_headers(self):
+        return {FORWARDED_HEADER: self.node_id or "", TOKEN_HEADER: self.secret or ""}
+
+    def authorized(self, headers):
+        return bool(self.secret) and secrets.compare_digest(headers.get(TOKEN_HEADER, ""), self.secret)
+
+    def owner(self, session_id):
+        return self.ring.owner(session_id) if self.enabled else self.node_id
+
+    def new_session_id(self):
+        """A fresh session id owned by this node (a plain uuid4 outside a cluster or on a node that left it)."""
+        while True:
+            session_id = str(uuid.uuid4())
+            if self.node_id not in self.ring.nodes or self.ring.owner(session_id) == self.node_id:
+                return session_id
+
+    def _previous_owner(self, session_id):
+        if self.previous_ring is None or time.monotonic() > self.previous_until:
+            return None
+        previous = self.previous_ring.owner(session_id)
+        return previous if previous != self.node_id else None
+
+    async def ensure_local(self, session_id):
+        """If a rebalance is under way and this node should hold ``session_id`` but doesn't, fetch it."""
+        if session_id in self.sessions or session_id in self.moving:
+            return
+        previous = self._previous_owner(session_id)
+        if previous is None:
+            return
+        await self._pulls.do(session_id, lambda: self._pull(session_id, previous))
+
+    async def _pull(self, session_id, node):
+        url = f"{self.previous_ring.nodes[node]}/cluster/sessions/{session_id}/handoff"
+        try:
+            response = await self.client.post(url, headers=self._internal_headers())
+        except Exception as e:
+            logger.warning("Could not pull session %s from %s: %s", session_id, node, e)
+            HANDOFFS.inc("pull", "error")
+            return
+        if response.status_code == 200 and session_id not in self.sessions:
+            self.sessions[session_id] = await asyncio.to_thread(import_session, json.loads(response.content))
+            HANDOFFS.inc("pull", "ok")
+
+    async def _quiesce(self, session_id):
+        deadline = time.monotonic() + HANDOFF_WAIT
+        while self.active.get(session_id) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def take(self, session_id):
+        """Remove a session for another node once its in-flight requests are done; None if not here."""
+        event = self.moving.get(session_id)
+        if event is not None:
+            await event.wait()
+            return None
+        if session_id not in self.sessions:
+            return None
+        self.moving[session_id] = asyncio.Event()
+        try:
+            await self._quiesce(session_id)
+            session = self.sessions.pop(session_id, None)
+            if session is None:
+                return None
+            data = await asyncio.to_thread(export_session, session)
+            session["moved_to"] = self.owner(session_id)
+            # Ends SSE streams and long polls here so clients reconnect to the new owner
+            notify(session)
+            return data
+        finally:
+            self.moving.pop(session_id).set()
+
+    async def hand_off(self, session_id):
+        owner = self.owner(session_id)
+        self.moving[session_id] = asyncio.Event()
+        session = None
+        try:
+            await self._quiesce(session_id)
+            session = self.sessions.pop(session_id, None)
+            if session is None:
+                return
+            body = wire.dumps(await asyncio.to_thread(export_session, session))
+            response = await self.client.put(f"{self.ring.nodes[owner]}/cluster/sessions/{session_id}",
+                                             content=body, headers=self._internal_headers())
+            response.raise_for_status()
+            session["moved_to"] = owner
+            notify(session)
+            HANDOFFS.inc("push", "ok")
+        except Exception as e:
+            logger.warning("Handoff of session %s to %s failed, keeping it: %s", session_id, owner, e)
+            HANDOFFS.inc("push", "error")
+            if session is not None:
+                self.sessions.setdefault(session_id, session)
+        finally:
+            self.moving.pop(session_id).set()
+
+    async def set_nodes(self, nodes):
+        """Switch to a new membership and hand off the sessions this node no longer owns."""
+        self.previous_ring = self.ring
+        self.previous_until = float("inf")
+        self.ring = HashRing(nodes)
+        leaving = [session_id for session_id in list(self.sessions) if self.owner(session_id) != self.node_id]
+        logger.info("Membership is now %s; handing off %d sessions", sorted(nodes), len(leaving))
+        # Sessions here are owned by this node from now on, unless they're being handed off
+        await asyncio.gather(*(self.hand_off(session_id) for session_id in leaving))
+        self.previous_until = time.monotonic() + REBALANCE_GRACE
+
+    def session_id_of(self, routes, scope, body):
+        for route in routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                session_id = child_scope.get("path_params", {}).get("session_id")
+                if session_id:
+                    return session_id
+                break
+
+        query = parse_qs(scope.get("query_string", b"").decode())
+        if query.get("session_id"):
+            return query["session_id"][0]
+
+        if body:
+            content_type = dict(scope["headers"]).get(b"content-type", b"")
+            if content_type.startswith(b"application/json"):
+                try:
+                    data = json.loads(body)
+                except ValueError:
+                    return None
+                return data.get("session_id") if isinstance(data, dict) else None
+            if content_type.startswith(b"multipart/form-data"):
+                match = _MULTIPART_SESSION_RE.search(body)
+                return match.group(1).decode() if match and match.group(1) else None
+        return None
+
+    async def forward(self, scope, body, send, node):
+        url = self.ring.nodes[node] + scope["raw_path"].decode()
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode()
+        headers = [(name, value) for name, value in scope["headers"] if name not in (b"host", b"content-length")]
+        headers.extend((name.encode(), value.encode()) for name, value in self._internal_headers().items())
+
+        try:
+            request = self.client.build_request(scope["method"], url, headers=headers, content=body)
+            response = await self.client.send(request, stream=True)
+        except Exception as e:
+            logger.warning("Forwarding %s %s to %s failed: %s", scope["method"], scope["path"], node, e)
+            FORWARDED.inc(node, "error")
+            await Response(wire.dumps({"detail": "The node holding this session is unavailable"}), status_code=503,
+                           media_type="application/json", headers={"Retry-After": "1"})(scope, None, send)
+            return
+
+        FORWARDED.inc(node, "ok")
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [(name, value) for name, value in response.headers.raw
+                            if name.lower() not in (b"transfer-encoding", b"connection")]
+            })
+            # Raw bytes, so a compressed body keeps its Content-Encoding
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await response.aclose()
+
+
+async def _buffer_body(receive):
+    """Read the whole request body; returns it with a ``receive`` that replays it."""
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    body = b"".join(chunks)
+
+    replayed = False
+
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return body, replay
+
+
+class SessionRouter:
+    """Pure ASGI middleware sending each request to the node that holds its session."""
+
+    def __init__(self, app, cluster, routes):
+        self.app = app
+        self.cluster = cluster
+        # The FastAPI app's route list, to read path parameters before routing
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        cluster = self.cluster
+        if scope["type"] != "http" or scope["path"].startswith("/cluster/"):
+            await self.app(scope, receive, send)
+            return
+
+        body = b""
+        if scope["method"] in ("POST", "PUT", "PATCH", "DELETE"):
+            body, receive = await _buffer_body(receive)
+        session_id = cluster.session_id_of(self.routes, scope, body)
+        if session_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode(): value.decode() for name, value in scope["headers"]}
+        forwarded = FORWARDED_HEADER in headers and cluster.authorized(headers)
+        if not forwarded:
+            if session_id in cluster.moving:
+                await cluster.moving[session_id].wait()
+            owner = cluster.owner(session_id)
+            if session_id not in cluster.sessions and owner != cluster.node_id:
+                await cluster.forward(scope, body, send, owner)
+                return
+        await cluster.ensure_local(session_id)
+
+        if scope["method"] == "GET":
+            await self.app(scope, receive, send)
+            return
+        cluster.active[session_id] = cluster.active.get(session_id, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            cluster.active[session_id] -= 1
+            if not cluster.active[session_id]:
+                del cluster.active[session_id]
+
+
+def install(app, sessions):
+    """Add session routing and the /cluster endpoints to ``app`` when ``CLUSTER_NODES`` is set."""
+    cluster = Cluster.from_env(sessions)
+    if not cluster.enabled:
+        return cluster
+
+    router = APIRouter(prefix="/cluster", include_in_schema=False)
+
+    def check_token(request):
+        if not cluster.authorized(request.headers):
+            raise HTTPException(status_code=403, detail="Missing or wrong cluster token")
+
+    @router.get("")
+    async def cluster_status():
+        return {
+            "node": cluster.node_id,
+            "nodes": cluster.ring.nodes,
+            "sessions": len(sessions),
+            "moving": len(cluster.moving),
+            "rebalancing": cluster.previous_ring is not None and time.monotonic() < cluster.previous_until
+        }
+
+    @router.put("/nodes")
+    async def put_nodes(request: Request):
+        check_token(request)
+        nodes = (await request.json())["nodes"]
+        if cluster.node_id not in nodes:
+            logger.info("Node %s is leaving the cluster", cluster.node_id)
+        await cluster.set_nodes(nodes)
+        return {"node": cluster.node_id, "sessions": len(sessions)}
+
+    @router.put("/sessions/{session_id}")
+    async def receive_session(session_id: str, request: Request):
+        check_token(request)
+        data = json.loads(await request.body())
+        sessions[session_id] = await asyncio.to_thread(import_session, data)
+        HANDOFFS.inc("receive", "ok")
+        return {"session_id": session_id}
+
+    @router.post("/sessions/{session_id}/handoff")
+    async def give_session(session_id: str, request: Request):
+        check_token(request)
+        data = await cluster.take(session_id)
+        if data is None:
+            raise HTTPException(status_code=404, detail="Session not here")
+        HANDOFFS.inc("give", "ok")
+        return Response(wire.dumps(data), media_type="application/json")
+
+    app.include_router(router)
+    app.add_middleware(SessionRouter, cluster=cluster, routes=app.router.routes)
+    metrics.gauge("cluster_moving_sessions", "Sessions being handed to another node", lambda: len(cluster.moving))
+    logger.info("Node %s of %s", cluster.node_id, sorted(cluster.ring.nodes))
+    return cluster
+
+
+def launch(count, base_port, host="127.0.0.1", target="chat_bot_api:app"):
+    """Run ``count`` local nodes of ``target`` until interrupted."""
+    nodes = {chr(ord("a") + i): f"http://{host}:{base_port + i}" for i in range(count)}
+    spec = ",".join(f"{node_id}={url}" for node_id, url in nodes.items())
+    secret = os.environ.get("CLUSTER_SECRET")
+    if not secret:
+        sys.exit("Set CLUSTER_SECRET first, e.g. export CLUSTER_SECRET=$(python -c 'import secrets; print(secrets.token_hex(16))')")
+    processes = []
+    for i, node_id in enumerate(nodes):
+        env = dict(os.environ, CLUSTER_NODES=spec, NODE_ID=node_id, CLUSTER_SECRET=secret)
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", target, "--host", host, "--port", str(base_port + i)], env=env))
+    print(f"CLUSTER_NODES={spec}", file=sys.stderr)
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.send_signal(signal.SIGINT)
+        for process in processes:
+            process.wait()
+
+
+def set_nodes(spec, notify_urls=()):
+    """Send the membership in ``spec`` to its nodes and to ``notify_urls`` (e.g. nodes being removed)."""
+    import httpx
+
+    nodes = parse_nodes(spec)
+    if not os.environ.get("CLUSTER_SECRET"):
+        sys.exit("Set CLUSTER_SECRET to the secret the nodes were started with")
+    headers = {TOKEN_HEADER: os.environ["CLUSTER_SECRET"]}
+    for url in dict.fromkeys([*nodes.values(), *notify_urls]):
+        response = httpx.put(f"{url}/cluster/nodes", json={"nodes": nodes}, headers=headers, timeout=HANDOFF_WAIT * 2)
+        print(url, response.status_code, response.text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run and reconfigure a local chat_bot_api cluster.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    launch_parser = commands.add_parser("launch", help="start several local nodes")
+    launch_parser.add_argument("--nodes", type=int, default=3)
+    launch_parser.add_argument("--base-port", type=int, default=8101)
+    set_parser = commands.add_parser("set-nodes", help="change membership, e.g. a=http://127.0.0.1:8101,b=...")
+    set_parser.add_argument("nodes")
+    set_parser.add_argument("--notify", nargs="*", default=[], help="also tell these node URLs (nodes leaving)")
+    args = parser.parse_args(argv)
+
+    if args.command == "launch":
+        launch(args.nodes, args.base_port)
+    else:
+        set_nodes(args.nodes, args.notify)
+
+
+if __name__ == "__main__":
+    main()
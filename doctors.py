@@ -0,0 +1,156 @@
+"""Doctor/specialist matching for assessment conditions.
+
+Doctors are numbered in rank order (rating, then experience, both
+descending), so every filter is a bitmask over those numbers and the best
+matches are simply the lowest set bits of the AND of the masks. Lookups cost
+a few big-int operations regardless of how many doctors are loaded.
+"""
+import re
+from functools import lru_cache
+
+# Specialty -> conditions it treats. Mirrors specialtyDiseaseMap in the
+# frontend's doctorUtils.ts; MedicalAssistant names and aliases are added on top.
+SPECIALTY_CONDITIONS = {
+    "General Physician": ["Flu", "COVID-19", "Fever", "Common Cold"],
+    "Pulmonologist": ["Pneumonia", "Asthma", "COVID-19", "Bronchitis"],
+    "Neurologist": ["Migraine", "Epilepsy", "Stroke"],
+    "Cardiologist": ["Hypertension", "Heart Disease", "Chest Pain"],
+    "Endocrinologist": ["Diabetes", "Thyroid Disorders"],
+    "Dermatologist": ["Eczema", "Psoriasis", "Skin Rash"],
+    "Gastroenterologist": ["Stomach Pain", "IBS", "Acid Reflux"],
+    "Pediatrician": ["Childhood Diseases", "Growth Issues"],
+    "Orthopedic": ["Joint Pain", "Fractures", "Arthritis"]
+}
+
+DEFAULT_SPECIALTY = "General Physician"
+
+DOCTORS = [
+    {"id": "doc1", "name": "Dr. Priya Sharma", "specialty": "General Physician", "experience": 8,
+     "languages": ["Hindi", "English"], "availability": "available",
+     "avatarUrl": "https://randomuser.me/api/portraits/women/44.jpg", "rating": 4.8},
+    {"id": "doc2", "name": "Dr. Rajesh Kumar", "specialty": "Pulmonologist", "experience": 12,
+     "languages": ["Hindi", "English", "Punjabi"], "availability": "available",
+     "avatarUrl": "https://randomuser.me/api/portraits/men/32.jpg", "rating": 4.9},
+    {"id": "doc3", "name": "Dr. Anjali Desai", "specialty": "Neurologist", "experience": 10,
+     "languages": ["Hindi", "English", "Gujarati"], "availability": "busy",
+     "avatarUrl": "https://randomuser.me/api/portraits/women/68.jpg", "rating": 4.7},
+    {"id": "doc4", "name": "Dr. Vikram Patel", "specialty": "Cardiologist", "experience": 15,
+     "languages": ["Hindi", "English"], "availability": "available",
+     "avatarUrl": "https://randomuser.me/api/portraits/men/45.jpg", "rating": 4.9},
+    {"id": "doc5", "name": "Dr. Meera Reddy", "specialty": "Endocrinologist", "experience": 9,
+     "languages": ["Hindi", "English", "Telugu"], "availability": "available",
+     "avatarUrl": "https://randomuser.me/api/portraits/women/25.jpg", "rating": 4.6},
+    {"id": "doc6", "name": "Dr. Sanjay Gupta", "specialty": "Dermatologist", "experience": 7,
+     "languages": ["Hindi", "English", "Bengali"], "availability": "offline",
+     "avatarUrl": "https://randomuser.me/api/portraits/men/59.jpg", "rating": 4.5},
+    {"id": "doc7", "name": "Dr. Neha Singh", "specialty": "Gastroenterologist", "experience": 11,
+     "languages": ["Hindi", "English"], "availability": "available",
+     "avatarUrl": "https://randomuser.me/api/portraits/women/17.jpg", "rating": 4.8},
+    {"id": "doc8", "name": "Dr. Amit Joshi", "specialty": "General Physician", "experience": 6,
+     "languages": ["Hindi", "English", "Marathi"], "availability": "available",
+     "avatarUrl": "https://randomuser.me/api/portraits/men/86.jpg", "rating": 4.4}
+]
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_condition(text):
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def _mask_from_ranks(ranks, size):
+    """Build a bitmask from bit positions in one pass instead of OR-ing big ints repeatedly."""
+    bitmap = bytearray((size + 7) // 8)
+    for rank in ranks:
+        bitmap[rank >> 3] |= 1 << (rank & 7)
+    return int.from_bytes(bitmap, "little")
+
+
+class DoctorIndex:
+    def __init__(self, doctors, specialty_conditions=SPECIALTY_CONDITIONS, medical_knowledge=None):
+        """Precompute the condition -> specialty index and the doctor bitmasks."""
+        self.doctors = sorted(doctors, key=lambda d: (-d["rating"], -d["experience"], d["id"]))
+
+        specialty_ranks, language_ranks, availability_ranks = {}, {}, {}
+        for rank, doctor in enumerate(self.doctors):
+            specialty_ranks.setdefault(doctor["specialty"], []).append(rank)
+            availability_ranks.setdefault(doctor["availability"], []).append(rank)
+            for language in doctor["languages"]:
+                language_ranks.setdefault(language.lower(), []).append(rank)
+
+        size = len(self.doctors)
+        self.specialty_bits = {key: _mask_from_ranks(ranks, size) for key, ranks in specialty_ranks.items()}
+        self.language_bits = {key: _mask_from_ranks(ranks, size) for key, ranks in language_ranks.items()}
+        self.availability_bits = {key: _mask_from_ranks(ranks, size) for key, ranks in availability_ranks.items()}
+
+        self.condition_specialties = {}
+        for specialty, conditions in specialty_conditions.items():
+            for condition in conditions:
+                self._index_condition(condition, specialty)
+
+        # Every KB disease and alias maps to the specialties of its canonical name
+        for disease, details in (medical_knowledge or {}).items():
+            specialties = self.condition_specialties.get(normalize_condition(disease), (DEFAULT_SPECIALTY,))
+            for name in [disease] + details.get("aliases", []):
+                for specialty in specialties:
+                    self._index_condition(name, specialty)
+
+        # Longest terms first so "heart disease" wins over "disease"-like fragments
+        self._terms = sorted(self.condition_specialties, key=len, reverse=True)
+        self.resolve_specialties = lru_cache(maxsize=4096)(self._resolve_specialties)
+
+    def _index_condition(self, condition, specialty):
+        specialties = self.condition_specialties.setdefault(normalize_condition(condition), ())
+        if specialty not in specialties:
+            self.condition_specialties[normalize_condition(condition)] = specialties + (specialty,)
+
+    def _resolve_specialties(self, condition):
+        """Specialties relevant to a free-text condition, e.g. an LLM assessment's output."""
+        normalized = normalize_condition(condition)
+        if not normalized:
+            return (DEFAULT_SPECIALTY,)
+
+        exact = self.condition_specialties.get(normalized)
+        if exact:
+            return exact
+
+        padded = f" {normalized} "
+        specialties = []
+        for term in self._terms:
+            if f" {term} " in padded or (len(normalized) > 3 and normalized in term):
+                for specialty in self.condition_specialties[term]:
+                    if specialty not in specialties:
+                        specialties.append(specialty)
+        return tuple(specialties) or (DEFAULT_SPECIALTY,)
+
+    def _take(self, mask, k, results):
+        while mask and len(results) < k:
+            lowest = mask & -mask
+            results.append(self.doctors[lowest.bit_length() - 1])
+            mask ^= lowest
+
+    def match(self, condition, language=None, availability=None, k=3):
+        """Top-k doctors for a condition, optionally filtered by language and availability.
+
+        Without an availability filter, offline doctors are skipped and
+        available doctors are listed before busy ones.
+        """
+        specialties = self.resolve_specialties(condition)
+        mask = 0
+        for specialty in specialties:
+            mask |= self.specialty_bits.get(specialty, 0)
+        if language:
+            mask &= self.language_bits.get(language.lower(), 0)
+
+        results = []
+        if availability:
+            self._take(mask & self.availability_bits.get(availability, 0), k, results)
+        else:
+            self._take(mask & self.availability_bits.get("available", 0), k, results)
+            self._take(mask & self.availability_bits.get("busy", 0), k, results)
+
+        return {
+            "condition": condition,
+            "specialties": list(specialties),
+            "doctors": results
+        }
@@ -0,0 +1,58 @@
+"""Session message history with stable ids for delta sync.
+
+Every message appended through ``append_message`` gets an id that increases
+monotonically within its session and survives ``/reset``, so a client can ask
+for "everything after the last id I have" instead of the whole conversation.
+``wait_for_messages`` lets long-poll and SSE handlers sleep until the next
+append rather than re-polling.
+"""
+import asyncio
+from bisect import bisect_right
+
+# session id -> Event set (and replaced) on the next append; only exists while someone waits
+_new_message_events = {}
+
+
+def append_message(session, role, content):
+    """Append a message to ``session["messages"]`` and wake anyone waiting for it."""
+    message_id = session.get("next_message_id", 1)
+    session["next_message_id"] = message_id + 1
+    message = {"id": message_id, "role": role, "content": content}
+    session["messages"].append(message)
+
+    notify(session)
+    return message
+
+
+def notify(session):
+    """Wake everyone waiting on the session, e.g. because it was handed to another node."""
+    event = _new_message_events.pop(session.get("id"), None)
+    if event is not None:
+        event.set()
+
+
+def last_message_id(session):
+    return session.get("next_message_id", 1) - 1
+
+
+def messages_since(session, since=0, limit=None):
+    """Messages with an id greater than ``since``, oldest first, at most ``limit`` of them."""
+    messages = session["messages"]
+    start = bisect_right(messages, since, key=lambda message: message.get("id", 0))
+    end = len(messages) if limit is None else min(len(messages), start + limit)
+    return messages[start:end]
+
+
+async def wait_for_messages(session, since, timeout):
+    """Wait up to ``timeout`` seconds for a message newer than ``since``; True if there is one."""
+    if last_message_id(session) > since:
+        return True
+
+    event = _new_message_events.get(session["id"])
+    if event is None:
+        event = _new_message_events[session["id"]] = asyncio.Event()
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return last_message_id(session) > since
@@ -0,0 +1,120 @@
+from functools import lru_cache
+
+# Small hand-labelled set the router is trained on at first use. "document"
+# means the answer has to come from the uploaded PDF, so retrieval is needed.
+TRAINING_EXAMPLES = {
+    "document": [
+        "what does the pdf say",
+        "what does it say about my blood sugar",
+        "summarize the document",
+        "summarise my report",
+        "what is in the uploaded file",
+        "read the report and explain it",
+        "explain my lab results",
+        "what are the values in my blood test report",
+        "according to the document what should i do",
+        "is my hemoglobin in the report normal",
+        "what does page 2 say",
+        "what medicines are listed in the prescription",
+        "explain the findings in the scan report",
+        "does the report mention diabetes",
+        "what dosage does the prescription mention",
+        "what did the doctor write in the discharge summary",
+        "summarize page 1",
+        "what are my lab results",
+        "what is my cholesterol level in the report",
+    ],
+    "medical": [
+        "i have a fever and headache",
+        "what are the symptoms of diabetes",
+        "i have been coughing for a week",
+        "my chest hurts when i breathe",
+        "is this disease contagious",
+        "what causes migraine",
+        "i feel dizzy and tired all the time",
+        "how is asthma treated",
+        "what condition causes frequent urination",
+        "my child has a rash and fever",
+        "should i see a doctor for back pain",
+        "what medicine can i take for a cold",
+        "i have stomach pain and vomiting",
+        "is high blood pressure dangerous",
+        "i lost my sense of taste and smell",
+        "how do i know if i have covid",
+    ],
+    "general": [
+        "hello",
+        "hi there",
+        "thank you",
+        "thanks for your help",
+        "how much water should i drink every day",
+        "what is a healthy diet",
+        "how many hours should i sleep",
+        "tips for staying fit",
+        "good morning",
+        "who are you",
+        "what can you do",
+        "how do i reduce stress",
+        "is walking good exercise",
+        "okay bye",
+        "what foods are rich in protein",
+        "how can i improve my sleep",
+    ],
+}
+
+AGENT_FOR_INTENT = {
+    "document": "pdf_agent",
+    "medical": "medical_query_agent",
+    "general": "general_agent",
+}
+
+
+@lru_cache(maxsize=1)
+def _get_model():
+    """Train the TF-IDF + logistic regression router once and reuse it."""
+    # scikit-learn takes over a second to import; only pay for it on first use
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    texts, labels = [], []
+    for label, examples in TRAINING_EXAMPLES.items():
+        texts.extend(examples)
+        labels.extend([label] * len(examples))
+
+    model = make_pipeline(
+        TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 5), sublinear_tf=True),
+        LogisticRegression(max_iter=1000, C=10.0)
+    )
+    model.fit(texts, labels)
+    return model
+
+
+def preload():
+    """Import scikit-learn and train the router ahead of the first message."""
+    _get_model()
+
+
+def is_loaded() -> bool:
+    """Whether the router has been trained, i.e. routing no longer imports or fits anything."""
+    return _get_model.cache_info().currsize > 0
+
+
+@lru_cache(maxsize=2048)
+def _intent_probabilities(message: str):
+    model = _get_model()
+    probabilities = model.predict_proba([message])[0]
+    return dict(zip(model.classes_, probabilities))
+
+
+def classify_intent(message: str, has_pdf: bool = False) -> str:
+    """Return 'document', 'medical' or 'general' for a user message."""
+    probabilities = dict(_intent_probabilities(message.strip().lower()))
+    if not has_pdf:
+        probabilities.pop("document", None)
+    return max(probabilities, key=probabilities.get)
+
+
+def route_message(message: str, has_pdf: bool = False) -> str:
+    """Map a user message to the name of the agent node that should answer it."""
+    return AGENT_FOR_INTENT[classify_intent(message, has_pdf)]
@@ -0,0 +1,38 @@
+"""Non-blocking logging shared by the services.
+
+Records are put on an in-memory queue by the calling thread and written to
+stderr by a background ``QueueListener`` thread, so request handlers never
+wait on a terminal or pipe. The level comes from ``LOG_LEVEL`` (default
+INFO); use %-style arguments so disabled levels skip formatting entirely.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+_listener = None
+
+
+def _configure():
+    global _listener
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger("healthcare")
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    """Return a logger under the ``healthcare`` namespace backed by the async queue handler."""
+    if _listener is None:
+        _configure()
+    return logging.getLogger(f"healthcare.{name}")
@@ -0,0 +1,197 @@
+"""In-process metrics with a Prometheus text endpoint.
+
+Histograms, counters and gauges are kept in a module-level registry and
+rendered on ``GET /metrics`` by apps that call ``install(app)``. Recording a
+sample is a dict lookup, a bisect and a couple of additions under a lock, so
+it is cheap enough for the request path.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from starlette.responses import PlainTextResponse
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    rendered = ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in pairs)
+    return "{" + rendered + "}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: ([*counts], total, count) for key, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, label_values)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, label_values)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def snapshot(self):
+        """A copy of every label set's value; inc() may add label sets from other threads meanwhile."""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.snapshot().items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    """A gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name, help_text, callback):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {self.callback()}"]
+
+
+def _get_or_create(name, factory):
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.get(name)
+            if metric is None:
+                metric = _registry[name] = factory()
+    return metric
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    return _get_or_create(name, lambda: Histogram(name, help_text, labels, buckets))
+
+
+def counter(name, help_text, labels=()):
+    return _get_or_create(name, lambda: Counter(name, help_text, labels))
+
+
+def gauge(name, help_text, callback):
+    """Register (or replace) a callback gauge."""
+    with _registry_lock:
+        _registry[name] = Gauge(name, help_text, callback)
+    return _registry[name]
+
+
+SPAN_DURATION = histogram("span_duration_seconds", "Duration of internal operations", labels=("span",))
+CACHE_REQUESTS = counter("cache_requests_total", "Cache lookups by cache and result", labels=("cache", "result"))
+
+
+@contextmanager
+def span(name):
+    """Time a block of code into ``span_duration_seconds{span=name}``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_DURATION.observe(time.perf_counter() - start, name)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def cache_hit_ratio(cache):
+    hits = CACHE_REQUESTS.value(cache, "hit")
+    total = hits + CACHE_REQUESTS.value(cache, "miss")
+    return hits / total if total else 0.0
+
+
+def render():
+    lines = []
+    for metric in list(_registry.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = histogram(
+    "http_request_duration_seconds", "HTTP request handling time", labels=("method", "route", "status")
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            REQUEST_DURATION.observe(time.perf_counter() - start, scope["method"], route_path, str(status[0]))
+
+
+def install(app):
+    """Add request timing middleware and a ``GET /metrics`` endpoint to a FastAPI app."""
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        for cache in sorted({labels[0] for labels in CACHE_REQUESTS.snapshot()}):
+            gauge(f"{cache}_cache_hit_ratio", f"Hit ratio of the {cache} cache", lambda cache=cache: cache_hit_ratio(cache))
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
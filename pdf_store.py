@@ -0,0 +1,329 @@
+import base64
+import hashlib
+import threading
+import uuid
+
+import metrics
+from bm25 import BM25Index
+from log import get_logger
+
+logger = get_logger("pdf_store")
+
+VECTOR_DIMENSION = 100
+# Rendered contexts kept per session, keyed by the tuple of retrieved chunk ids
+CONTEXT_CACHE_SIZE = 16
+
+# Hybrid retrieval: each retriever proposes this many candidates per requested
+# chunk; keyword matches scoring under KEYWORD_CUTOFF x the best BM25 score are
+# dropped, the rankings are merged with weighted reciprocal-rank fusion, and
+# chunks under FUSION_CUTOFF x the best fused score are dropped too.
+CANDIDATES_PER_CHUNK = 4
+KEYWORD_CUTOFF = 0.5
+RRF_K = 60
+# The hash vectors carry no meaning, so keyword matches are trusted more
+RRF_WEIGHTS = {"keyword": 1.0, "vector": 0.5}
+FUSION_CUTOFF = 0.6
+
+# Rebuild the Faiss index once this fraction of its vectors belongs to deleted documents
+COMPACTION_RATIO = 0.25
+
+
+def create_pdf_store():
+    """Create an empty store for one session's PDF pages.
+
+    Every page is a chunk with a stable integer id, used both in the Faiss
+    ``IndexIDMap2`` and the BM25 index. Deleting a document removes its chunks
+    from ``chunks`` and BM25 right away and tombstones their vectors until
+    ``compact`` rebuilds the index. The Faiss index is built on the first
+    upload, so sessions that never send a PDF don't load faiss at all.
+    """
+    return {
+        "index": None,
+        "bm25": BM25Index(),
+        "chunks": {},  # chunk id -> {"doc_id", "page", "total_pages", "text"}
+        "documents": {},  # doc id -> {"name", "path", "pages", "chunk_ids"}
+        "next_chunk_id": 0,
+        "tombstones": set(),
+        # Guards the indexes: uploads and compaction run in worker threads
+        "lock": threading.Lock()
+    }
+
+
+def preload():
+    """Import faiss, numpy and the PDF loader ahead of the first upload."""
+    import faiss
+    import numpy
+    from langchain_community.document_loaders import PyPDFLoader
+
+
+def _new_index():
+    import faiss
+
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(VECTOR_DIMENSION))
+
+
+def text_to_vector(text, dimension=VECTOR_DIMENSION):
+    import numpy as np
+
+    hash_object = hashlib.md5(text.encode())
+    hash_hex = hash_object.hexdigest()
+
+    vector = np.zeros(dimension)
+    for i in range(min(dimension, len(hash_hex))):
+        vector[i] = int(hash_hex[i], 16) / 16.0
+
+    return vector
+
+
+def process_pdf(file_path, session, doc_id=None, name=None):
+    """Load a PDF and index its pages into ``session["pdf_store"]`` as document ``doc_id``.
+
+    Returns the page count.
+    """
+    store = session["pdf_store"]
+    try:
+        import numpy as np
+        from langchain_community.document_loaders import PyPDFLoader
+
+        with metrics.span("pdf_parse"):
+            loader = PyPDFLoader(file_path)
+            docs = loader.load()
+
+        with metrics.span("pdf_embed"):
+            embeddings = np.array([text_to_vector(doc.page_content) for doc in docs])
+
+        doc_id = doc_id or uuid.uuid4().hex
+        with metrics.span("pdf_index"), store["lock"]:
+            first_id = store["next_chunk_id"]
+            chunk_ids = list(range(first_id, first_id + len(docs)))
+            store["next_chunk_id"] = first_id + len(docs)
+
+            if len(docs):
+                if store["index"] is None:
+                    store["index"] = _new_index()
+                store["index"].add_with_ids(embeddings, np.array(chunk_ids, dtype="int64"))
+            for i, (chunk_id, doc) in enumerate(zip(chunk_ids, docs)):
+                store["bm25"].add(chunk_id, doc.page_content)
+                store["chunks"][chunk_id] = {
+                    "doc_id": doc_id,
+                    "page": i+1,
+                    "total_pages": len(docs),
+                    "text": doc.page_content
+                }
+            store["documents"][doc_id] = {
+                "name": name or file_path,
+                "path": file_path,
+                "pages": len(docs),
+                "chunk_ids": chunk_ids
+            }
+
+        session["has_pdf"] = True
+        return len(docs)
+    except Exception as e:
+        logger.error("Error processing PDF: %s", e)
+        return 0
+
+
+def list_documents(session):
+    return [
+        {"doc_id": doc_id, "name": document["name"], "pages": document["pages"]}
+        for doc_id, document in session["pdf_store"]["documents"].items()
+    ]
+
+
+def delete_document(session, doc_id):
+    """Remove a document's chunks from the session. Returns the deleted document entry, or None."""
+    store = session["pdf_store"]
+    with store["lock"]:
+        document = store["documents"].pop(doc_id, None)
+        if document is None:
+            return None
+        for chunk_id in document["chunk_ids"]:
+            chunk = store["chunks"].pop(chunk_id)
+            store["bm25"].remove(chunk_id, chunk["text"])
+            store["tombstones"].add(chunk_id)
+        store.pop("context_cache", None)
+
+        # Pinned prompt contexts quoting the document must not outlive it;
+        # pin_context() appends to the log under the same lock
+        deleted = set(document["chunk_ids"])
+        if "context_log" in session:
+            session["context_log"][:] = [entry for entry in session["context_log"] if deleted.isdisjoint(entry[2])]
+        session.pop("context_chunk_ids", None)
+        session["has_pdf"] = bool(store["documents"])
+    return document
+
+
+def needs_compaction(store):
+    index = store["index"]
+    return index is not None and len(store["tombstones"]) >= max(1, index.ntotal * COMPACTION_RATIO)
+
+
+def compact(store):
+    """Rebuild the Faiss index without the vectors of deleted documents."""
+    import numpy as np
+
+    with metrics.span("pdf_compact"), store["lock"]:
+        index = store["index"]
+        if index is None or not store["tombstones"]:
+            return
+        live_ids = np.array(sorted(store["chunks"]), dtype="int64")
+        compacted = None
+        if len(live_ids):
+            compacted = _new_index()
+            compacted.add_with_ids(np.vstack([index.reconstruct(int(chunk_id)) for chunk_id in live_ids]), live_ids)
+        logger.info("Compacted PDF index from %d to %d vectors", index.ntotal, len(live_ids))
+        store["index"] = compacted
+        store["tombstones"].clear()
+
+
+def export_store(store):
+    """A JSON-serializable copy of a store, for handing its session to another node.
+
+    The Faiss index travels as ``faiss.serialize_index`` bytes; the BM25 index
+    is rebuilt from the chunk texts on import, and the lock and context cache
+    are recreated.
+    """
+    with store["lock"]:
+        index = None
+        if store["index"] is not None:
+            import faiss
+
+            index = base64.b64encode(faiss.serialize_index(store["index"]).tobytes()).decode()
+        return {
+            "index": index,
+            "chunks": [[chunk_id, chunk] for chunk_id, chunk in store["chunks"].items()],
+            "documents": store["documents"],
+            "next_chunk_id": store["next_chunk_id"],
+            "tombstones": sorted(store["tombstones"])
+        }
+
+
+def import_store(data):
+    """Rebuild a store from ``export_store`` output."""
+    store = create_pdf_store()
+    if data["index"] is not None:
+        import faiss
+        import numpy as np
+
+        store["index"] = faiss.deserialize_index(np.frombuffer(base64.b64decode(data["index"]), dtype="uint8"))
+    for chunk_id, chunk in data["chunks"]:
+        store["chunks"][chunk_id] = chunk
+        store["bm25"].add(chunk_id, chunk["text"])
+    store["documents"] = data["documents"]
+    store["next_chunk_id"] = data["next_chunk_id"]
+    store["tombstones"] = set(data["tombstones"])
+    return store
+
+
+def vector_search(query, session, k, doc_ids=None):
+    """Ids of the ``k`` chunks whose vectors are closest to the query's, best first.
+
+    Call with ``session["pdf_store"]["lock"]`` held.
+    """
+    import faiss
+    import numpy as np
+
+    store = session["pdf_store"]
+    index = store["index"]
+    if index is None or not index.ntotal:
+        return []
+
+    if doc_ids is not None:
+        allowed = [chunk_id for doc_id in doc_ids for chunk_id in store["documents"].get(doc_id, {}).get("chunk_ids", ())]
+        if not allowed:
+            return []
+        selector = faiss.IDSelectorBatch(np.array(allowed, dtype="int64"))
+    elif store["tombstones"]:
+        deleted = faiss.IDSelectorBatch(np.array(list(store["tombstones"]), dtype="int64"))
+        selector = faiss.IDSelectorNot(deleted)
+    else:
+        selector = None
+
+    query_vector = text_to_vector(query)
+    with metrics.span("faiss_search"):
+        params = faiss.SearchParameters(sel=selector) if selector is not None else None
+        D, I = index.search(np.array([query_vector]), min(k, index.ntotal), params=params)
+
+    return [int(idx) for idx in I[0] if int(idx) in store["chunks"]]
+
+
+def keyword_search(query, session, k, doc_ids=None):
+    """Ids of up to ``k`` strong BM25 matches for the query, best first.
+
+    Call with ``session["pdf_store"]["lock"]`` held.
+    """
+    store = session["pdf_store"]
+    allowed = None
+    if doc_ids is not None:
+        doc_ids = set(doc_ids)
+        allowed = lambda chunk_id: store["chunks"][chunk_id]["doc_id"] in doc_ids
+
+    with metrics.span("bm25_search"):
+        matches = store["bm25"].search(query, k, allowed)
+    if not matches:
+        return []
+    threshold = matches[0][1] * KEYWORD_CUTOFF
+    return [chunk_id for chunk_id, score in matches if score >= threshold]
+
+
+def fuse_rankings(rankings, top_k):
+    """Weighted reciprocal-rank fusion of ``{retriever: [ids, best first]}`` with a relative cutoff."""
+    scores = {}
+    for retriever, ids in rankings.items():
+        weight = RRF_WEIGHTS[retriever]
+        for rank, chunk_id in enumerate(ids, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (RRF_K + rank)
+    if not scores:
+        return ()
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    threshold = ranked[0][1] * FUSION_CUTOFF
+    return tuple(chunk_id for chunk_id, score in ranked[:top_k] if score >= threshold)
+
+
+def retrieve_chunks(query, session, top_k=3, doc_ids=None):
+    """Return the ids of up to ``top_k`` relevant chunks, fusing keyword and vector search.
+
+    ``doc_ids`` restricts the search to those documents.
+    """
+    candidates = top_k * CANDIDATES_PER_CHUNK
+    with session["pdf_store"]["lock"]:
+        return fuse_rankings({
+            "keyword": keyword_search(query, session, candidates, doc_ids),
+            "vector": vector_search(query, session, candidates, doc_ids)
+        }, top_k)
+
+
+def render_chunks(session, chunk_ids):
+    store = session["pdf_store"]
+    results = []
+    for chunk_id in chunk_ids:
+        chunk = store["chunks"].get(chunk_id)
+        document = store["documents"].get(chunk["doc_id"]) if chunk else None
+        if document is None:  # deleted since it was retrieved
+            continue
+        page_info = f"[{document['name']}, page {chunk['page']}/{chunk['total_pages']}]"
+        results.append(f"{page_info} {chunk['text']}")
+
+    return "\n\n".join(results)
+
+
+def retrieve_context(query, session, top_k=3, doc_ids=None):
+    """Search the session's PDFs, reusing the rendered context when the same chunks come back.
+
+    Returns ``(chunk_ids, context, cache_hit)``.
+    """
+    chunk_ids = retrieve_chunks(query, session, top_k, doc_ids)
+
+    cache = session["pdf_store"].setdefault("context_cache", {})
+    hit = chunk_ids in cache
+    metrics.record_cache("retrieval", hit)
+    if hit:
+        return chunk_ids, cache[chunk_ids], True
+
+    context = render_chunks(session, chunk_ids)
+    if len(cache) >= CONTEXT_CACHE_SIZE:
+        cache.pop(next(iter(cache)))
+    cache[chunk_ids] = context
+    return chunk_ids, context, False
@@ -0,0 +1,297 @@
+"""On-demand per-request profiling in collapsed-stack (flamegraph) format.
+
+Off unless ``PROFILING=1``; when off, ``install`` adds nothing to the app.
+When on, ``PROFILE_TOKEN`` is required (profiles expose paths and code) and a
+request is profiled if it carries ``x-profile: <PROFILE_TOKEN>`` or is picked
+at ``PROFILE_SAMPLE_RATE``. Reading profiles needs the same header.
+A profiled request gets a sampler thread that, every ``PROFILE_INTERVAL``
+seconds, records:
+
+* the stack of every busy thread (FAISS search, PDF parsing and knowledge
+  base scoring run in worker threads or on the event loop), and
+* while the event loop is idle, the chain of coroutines the request's task
+  is suspended in, under an ``await`` frame, so time spent waiting on Groq
+  shows up as ``...;await;chat_graph.py:agent_func;...``.
+
+Samples are wall-clock and cover every thread, so concurrent requests add
+their own frames; profile under light load for clean graphs. Finished
+profiles keep the last ``PROFILE_CAPACITY`` in memory and are served at
+``GET /debug/profiles`` and ``GET /debug/profiles/{id}``; the latter is
+collapsed-stack text for flamegraph.pl or speedscope:
+
+    curl -H "x-profile: $PROFILE_TOKEN" -i localhost:8000/predict ...   # note x-profile-id
+    curl -H "x-profile: $PROFILE_TOKEN" localhost:8000/debug/profiles/<id> > predict.folded
+"""
+import asyncio
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import lru_cache
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+import metrics
+from log import get_logger
+
+logger = get_logger("profiling")
+
+PROFILING = os.environ.get("PROFILING", "") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_CAPACITY = 100
+# Header-triggered floods must not turn every request into a profiled one
+MAX_ACTIVE_PROFILES = 4
+MAX_PROFILE_SECONDS = 60
+MAX_DEPTH = 128
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "x-profile-id"
+SKIPPED_PATHS = ("/debug/profiles", "/metrics")
+
+# A thread whose innermost Python frame is one of these is waiting, not working
+_IDLE_FILES = {"threading.py", "selectors.py", "queue.py", os.path.basename(__file__)}
+_IDLE_FRAMES = {"thread.py:_worker", "handlers.py:QueueListener.dequeue"}
+
+PROFILES = metrics.counter("profiles_total", "Profiled requests by trigger", ("trigger",))
+
+# The Sampler of the request being profiled, seen by the task factory in every task it creates
+_current = ContextVar("profiler", default=None)
+
+
+@lru_cache(maxsize=8192)
+def _label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_qualname}"
+
+
+def _is_idle(frame):
+    return os.path.basename(frame.f_code.co_filename) in _IDLE_FILES or _label(frame.f_code) in _IDLE_FRAMES
+
+
+def _thread_stack(frame):
+    """Labels from the outermost frame to ``frame``."""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _await_stack(task, tracked):
+    """Labels of the coroutines ``task`` is suspended in, outermost first.
+
+    Follows awaited tasks that are not in ``tracked`` (those are sampled on
+    their own); stops at a bare future (I/O, a lock, ``asyncio.wait``).
+    """
+    labels = []
+    awaitable = task.get_coro()
+    while awaitable is not None and len(labels) < MAX_DEPTH:
+        if isinstance(awaitable, asyncio.Task):
+            if awaitable in tracked:
+                break
+            awaitable = awaitable.get_coro()
+            continue
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(_label(frame.f_code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return labels
+
+
+class Sampler:
+    """Samples stacks into ``stacks`` from a daemon thread until ``stop()``.
+
+    ``tasks`` maps every task created while handling the request to the task
+    that created it, so suspended child tasks (LangGraph nodes, streaming
+    responses) are sampled under their parent's await chain.
+    """
+
+    def __init__(self, task, loop_thread, interval=PROFILE_INTERVAL):
+        self.task = task
+        self.loop_thread = loop_thread
+        self.interval = interval
+        self.tasks = {task: None}
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        deadline = time.monotonic() + MAX_PROFILE_SECONDS
+        while not self._stopped.wait(self.interval) and time.monotonic() < deadline:
+            self.sample()
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            name = names.get(ident, str(ident))
+            if not _is_idle(frame):
+                self.stacks[";".join([name, *_thread_stack(frame)])] += 1
+            elif ident == self.loop_thread:
+                for stack in self._await_stacks():
+                    self.stacks[";".join([name, "await", *stack])] += 1
+        self.samples += 1
+
+    def _await_stacks(self):
+        # The event loop thread adds tasks concurrently; list() copies the dict atomically
+        tasks = dict(list(self.tasks.items()))
+        pending = {task for task in tasks if not task.done()}
+        waiting_on_children = {tasks[task] for task in pending}
+        for task in pending - waiting_on_children:
+            chain = []
+            while task is not None:
+                chain.append(task)
+                task = tasks[task]
+            yield [label for task in reversed(chain) for label in _await_stack(task, tasks)]
+
+
+def _task_factory(loop, coro, **kwargs):
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    sampler = _current.get()
+    if sampler is not None:
+        sampler.tasks[task] = asyncio.current_task(loop)
+    return task
+
+
+def _profile(profile_id, sampler, scope, status, trigger, started, duration):
+    leaves = Counter()
+    for stack, count in sampler.stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    route = scope.get("route")
+    return {
+        "id": profile_id,
+        "method": scope["method"],
+        "path": scope["path"],
+        "route": getattr(route, "path", None),
+        "status": status,
+        "trigger": trigger,
+        "started": started,
+        "duration_ms": duration * 1000,
+        "interval_ms": sampler.interval * 1000,
+        "samples": sampler.samples,
+        "top": [{"frame": frame, "samples": count} for frame, count in leaves.most_common(10)],
+        "stacks": dict(sampler.stacks)
+    }
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling header-triggered and sampled requests into ``store``."""
+
+    def __init__(self, app, store, sample_rate=PROFILE_SAMPLE_RATE, token=PROFILE_TOKEN):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.token = token
+        self.active = 0
+
+    def _trigger(self, scope):
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER.encode():
+                return "header" if self.token and secrets.compare_digest(value, self.token.encode()) else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(SKIPPED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None or self.active >= MAX_ACTIVE_PROFILES:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:16]
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER.encode(), profile_id.encode())]
+            await send(message)
+
+        sampler = Sampler(asyncio.current_task(), threading.get_ident())
+        self.active += 1
+        started = time.time()
+        start = time.perf_counter()
+        sampler.start()
+        token = _current.set(sampler)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            duration = time.perf_counter() - start
+            await asyncio.to_thread(sampler.stop)
+            self.active -= 1
+            self.store.append(_profile(profile_id, sampler, scope, status[0], trigger, started, duration))
+            PROFILES.inc(trigger)
+            logger.info("Profiled %s %s in %.0f ms (%d samples): %s", scope["method"], scope["path"],
+                        duration * 1000, sampler.samples, profile_id)
+
+
+def install(app):
+    """Add the profiling middleware and ``/debug/profiles`` endpoints when ``PROFILING=1``."""
+    if not PROFILING:
+        return None
+    if not PROFILE_TOKEN:
+        raise RuntimeError("PROFILING=1 needs PROFILE_TOKEN; refusing to expose /debug/profiles unauthenticated")
+    store = deque(maxlen=PROFILE_CAPACITY)
+    router = APIRouter(prefix="/debug/profiles", include_in_schema=False)
+
+    def check_token(request):
+        if not secrets.compare_digest(request.headers.get(PROFILE_HEADER, "").encode(), PROFILE_TOKEN.encode()):
+            raise HTTPException(status_code=403, detail="Missing or wrong profile token")
+
+    @router.get("")
+    async def list_profiles(request: Request, path: str = None, min_ms: float = 0):
+        """Recent profiles, newest first, without their stacks."""
+        check_token(request)
+        return {"profiles": [
+            {key: value for key, value in profile.items() if key != "stacks"}
+            for profile in reversed(store)
+            if profile["duration_ms"] >= min_ms and (path is None or profile["path"].startswith(path))
+        ]}
+
+    @router.get("/{profile_id}")
+    async def get_profile(profile_id: str, request: Request, format: str = "collapsed"):
+        check_token(request)
+        for profile in store:
+            if profile["id"] == profile_id:
+                break
+        else:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        if format == "json":
+            return profile
+        lines = [f"{stack} {count}" for stack, count in sorted(profile["stacks"].items())]
+        return PlainTextResponse("\n".join(lines) + "\n")
+
+    async def track_tasks():
+        loop = asyncio.get_running_loop()
+        if loop.get_task_factory() is None:
+            loop.set_task_factory(_task_factory)
+        else:
+            logger.warning("Event loop already has a task factory; profiles will not follow child tasks")
+
+    app.include_router(router)
+    app.add_middleware(ProfilingMiddleware, store=store)
+    app.router.add_event_handler("startup", track_tasks)
+    logger.info("Profiling enabled (sample rate %s, header %s)", PROFILE_SAMPLE_RATE, PROFILE_HEADER)
+    return store
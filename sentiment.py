@@ -0,0 +1,44 @@
+import re
+
+# Small lexicon tuned for patient messages. Weights are rough: strong distress
+# words count double so "severe pain" beats a polite "thanks" in the same turn.
+NEGATIVE_WORDS = {
+    "worried": 2, "worry": 2, "scared": 2, "afraid": 2, "anxious": 2, "panic": 2,
+    "frightened": 2, "terrified": 2, "nervous": 1, "unbearable": 2, "terrible": 2,
+    "awful": 2, "severe": 1, "worse": 1, "worsening": 1, "bad": 1, "pain": 1,
+    "painful": 1, "hurts": 1, "hurt": 1, "sad": 1, "depressed": 2, "hopeless": 2,
+    "dying": 2, "emergency": 2, "cant": 1, "sick": 1, "upset": 1, "stressed": 1,
+}
+
+POSITIVE_WORDS = {
+    "better": 1, "good": 1, "great": 1, "fine": 1, "thanks": 1, "thank": 1,
+    "relieved": 2, "happy": 1, "glad": 1, "improving": 1, "improved": 1,
+    "helpful": 1, "okay": 1, "ok": 1, "well": 1, "recovered": 2,
+}
+
+NEGATIONS = {"not", "no", "never", "dont", "isnt", "wasnt", "arent", "without", "hardly"}
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+
+def classify_sentiment(text: str) -> str:
+    """Classify a message as 'positive', 'negative' or 'neutral' without an LLM call."""
+    tokens = _TOKEN_RE.findall(text.lower().replace("'", ""))
+    score = 0
+    negate_window = 0
+    for token in tokens:
+        if token in NEGATIONS:
+            negate_window = 2
+            continue
+        weight = NEGATIVE_WORDS.get(token, 0) * -1 or POSITIVE_WORDS.get(token, 0)
+        if weight and negate_window:
+            weight = -weight
+        score += weight
+        if negate_window:
+            negate_window -= 1
+
+    if score < 0:
+        return "negative"
+    if score > 0:
+        return "positive"
+    return "neutral"
@@ -0,0 +1,37 @@
+"""Request coalescing for identical in-flight work.
+
+``SingleFlight.do(key, fn)`` runs ``fn()`` once per key at a time: callers
+that arrive while a computation for the same key is still running await that
+computation and share its result (or exception) instead of starting their own.
+Nothing is cached once the computation finishes.
+"""
+import asyncio
+
+import metrics
+
+SINGLEFLIGHT_CALLS = metrics.counter(
+    "singleflight_calls_total", "Coalesced-call outcomes: 'leader' ran the work, 'collapsed' shared it",
+    labels=("group", "result")
+)
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+
+    async def do(self, key, fn):
+        """Return the result of ``await fn()``, sharing it with concurrent callers using the same key."""
+        task = self._inflight.get(key)
+        if task is None:
+            # A separate task, so a cancelled leader doesn't cancel the work its followers wait on
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            SINGLEFLIGHT_CALLS.inc(self.name, "leader")
+        else:
+            SINGLEFLIGHT_CALLS.inc(self.name, "collapsed")
+        return await asyncio.shield(task)
+
+    def __len__(self):
+        return len(self._inflight)
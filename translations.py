@@ -0,0 +1,181 @@
+"""Per-language variants of the knowledge base's display strings.
+
+Every language has a cache file ``TRANSLATIONS_DIR/<code>.json``:
+
+    {"language": "हिन्दी",
+     "strings": {"<English KB text>": "<translation>", ...},
+     "aliases": {"<English disease or symptom>": ["<other native names>", ...]}}
+
+``strings`` covers disease names, aliases, symptoms, descriptions and the
+fixed response messages (``MedicalAssistant.translatable_strings()``);
+``aliases`` adds colloquial names that are only used to recognise input.
+``MedicalAssistant`` compiles these into its lookup indexes, so serving a
+language is a dict lookup per string. Missing entries fall back to English
+and are filled offline, in batches, by:
+
+    python -m translations missing --lang hi
+    python -m translations fill --lang mr --language Marathi
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import unicodedata
+from functools import lru_cache
+
+from log import get_logger
+
+logger = get_logger("translations")
+
+TRANSLATIONS_DIR = os.environ.get("TRANSLATIONS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "translations"))
+DEFAULT_LANGUAGE = "en"
+# Names the frontend's LanguageContext uses
+LANGUAGE_ALIASES = {"english": "en", "hindi": "hi"}
+FILL_BATCH_SIZE = 40
+
+_PLACEHOLDER_RE = re.compile(r"\{[a-z_]+\}")
+_NUKTA = "़"
+
+
+def normalize(text):
+    """Matching key for user input: NFC, case-folded, single spaces, Devanagari nukta dropped."""
+    text = unicodedata.normalize("NFC", text).casefold().replace(_NUKTA, "")
+    return " ".join(text.split())
+
+
+def language_code(lang):
+    """``lang`` as a cache code, e.g. "Hindi" -> "hi"; None means English."""
+    if not lang:
+        return DEFAULT_LANGUAGE
+    lang = lang.strip().lower()
+    return LANGUAGE_ALIASES.get(lang, lang)
+
+
+class TranslationCache:
+    def __init__(self, lang, directory=TRANSLATIONS_DIR):
+        self.lang = lang
+        self.path = os.path.join(directory, f"{lang}.json")
+        self.language = lang
+        self.strings = {}
+        self.aliases = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.language = data.get("language", lang)
+            self.strings = data.get("strings", {})
+            self.aliases = data.get("aliases", {})
+
+    def missing(self, texts):
+        return [text for text in dict.fromkeys(texts) if text not in self.strings]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"language": self.language, "strings": self.strings, "aliases": self.aliases},
+                      f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        os.replace(temporary, self.path)
+
+
+def available_languages(directory=TRANSLATIONS_DIR):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(filename[:-5] for filename in os.listdir(directory) if filename.endswith(".json"))
+
+
+# Read once: ``lang`` comes from clients, so lookups must not touch the disk or grow a cache
+AVAILABLE_LANGUAGES = frozenset(available_languages())
+
+
+def load(lang):
+    """The cache for ``lang``, read once per process; None when there is no file for it."""
+    if lang not in AVAILABLE_LANGUAGES:
+        return None
+    return _load(lang)
+
+
+@lru_cache(maxsize=None)
+def _load(lang):
+    return TranslationCache(lang)
+
+
+def llm_translator(language, model=None):
+    """Translate a list of strings into ``language`` with one Groq call per batch."""
+    from langchain_groq import ChatGroq
+
+    from chat_graph import GROQ_MODEL
+
+    llm = ChatGroq(model=model or GROQ_MODEL, temperature=0)
+
+    def translate(texts):
+        prompt = (
+            f"Translate each of these medical app strings from English into {language}, "
+            "in the native script, in plain words a rural patient would understand. "
+            "Keep placeholders like {disease} unchanged and keep line breaks. "
+            "Answer with only a JSON object mapping each English string to its translation.\n\n"
+            + json.dumps(texts, ensure_ascii=False, indent=1)
+        )
+        reply = llm.invoke(prompt).content
+        return json.loads(reply[reply.index("{"):reply.rindex("}") + 1])
+
+    return translate
+
+
+def fill(cache, texts, translate, batch_size=FILL_BATCH_SIZE):
+    """Translate the ``texts`` missing from ``cache`` batch by batch, saving after each one.
+
+    Translations that drop or invent ``{placeholders}`` are rejected. Returns
+    the number of strings added.
+    """
+    added = 0
+    missing = cache.missing(texts)
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        try:
+            translated = translate(batch)
+        except (ValueError, KeyError) as e:
+            logger.warning("Skipping a batch of %d strings: %s", len(batch), e)
+            continue
+        for text in batch:
+            translation = translated.get(text)
+            if not isinstance(translation, str) or not translation.strip():
+                continue
+            if sorted(_PLACEHOLDER_RE.findall(translation)) != sorted(_PLACEHOLDER_RE.findall(text)):
+                logger.warning("Rejected translation of %r: placeholders changed", text)
+                continue
+            cache.strings[text] = translation.strip()
+            added += 1
+        cache.save()
+        logger.info("Translated %d/%d strings into %s", min(start + batch_size, len(missing)), len(missing), cache.lang)
+    return added
+
+
+def main(argv=None):
+    from app import MedicalAssistant
+
+    parser = argparse.ArgumentParser(description="Inspect and fill the knowledge base translation cache.")
+    parser.add_argument("command", choices=["missing", "fill"])
+    parser.add_argument("--lang", required=True, help="language code, e.g. hi or mr")
+    parser.add_argument("--language", help="language name for the LLM and the cache file, e.g. Marathi")
+    parser.add_argument("--batch", type=int, default=FILL_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    cache = TranslationCache(language_code(args.lang))
+    if args.language:
+        cache.language = args.language
+    texts = MedicalAssistant().translatable_strings()
+
+    if args.command == "missing":
+        for text in cache.missing(texts):
+            print(json.dumps(text, ensure_ascii=False))
+        return 0
+
+    added = fill(cache, texts, llm_translator(args.language or cache.language), args.batch)
+    print(f"Added {added} translations; {len(cache.missing(texts))} still missing", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Optional background warm-up for the FastAPI services.
+
+Heavy dependencies (faiss, scikit-learn, langgraph, langchain_groq) are
+imported on first use so a worker starts accepting connections quickly.
+``install(app, *hooks)`` then pays those costs in the background once start-up
+has finished, instead of on the first unlucky request. Plain functions run in
+a worker thread; coroutine functions are awaited on the event loop. Set
+``WARMUP=0`` to disable it, e.g. when measuring cold starts.
+"""
+import asyncio
+import os
+import time
+
+import metrics
+from log import get_logger
+
+logger = get_logger("warmup")
+
+
+def enabled():
+    return os.environ.get("WARMUP", "1") != "0"
+
+
+async def run_hooks(hooks):
+    # Yield first so the server finishes starting up before any work begins
+    await asyncio.sleep(0)
+    for hook in hooks:
+        start = time.perf_counter()
+        try:
+            with metrics.span(f"warmup_{hook.__module__}.{hook.__name__}"):
+                if asyncio.iscoroutinefunction(hook):
+                    await hook()
+                else:
+                    await asyncio.to_thread(hook)
+        except Exception as e:
+            logger.warning("Warm-up hook %s.%s failed: %s", hook.__module__, hook.__name__, e)
+        else:
+            logger.debug("Warm-up hook %s.%s took %.3fs", hook.__module__, hook.__name__, time.perf_counter() - start)
+
+
+def install(app, *hooks):
+    """Run ``hooks`` in order in the background after ``app`` has started."""
+    async def start_warmup():
+        if enabled():
+            # Keep a reference so the task isn't garbage collected mid-run
+            app.state.warmup = asyncio.create_task(run_hooks(hooks))
+
+    app.router.add_event_handler("startup", start_warmup)
@@ -0,0 +1,90 @@
+"""Response encoding shared by both FastAPI services.
+
+* ``ORJSONResponse`` serializes with orjson (falls back to the stdlib when it
+  isn't installed) and is the default response class of both apps.
+* ``respond(request, content, fields)`` picks the body format from the
+  ``Accept`` header: MessagePack (via ``ormsgpack``) for ``application/msgpack``,
+  JSON otherwise, with ``Vary: Accept``. A client that only accepts
+  MessagePack gets 406 if ``ormsgpack`` is missing. ``fields`` is the
+  comma-separated ``fields=`` query parameter; when given, only those
+  top-level keys are sent, so clients can drop e.g. the pre-rendered
+  ``message``.
+* ``install(app)`` compresses larger bodies with brotli or gzip
+  (``brotli-asgi``), or only gzip, with a warning, if it is missing.
+
+Handlers that return ``respond(...)`` skip FastAPI's response-model
+validation; their ``response_model`` only documents the schema.
+"""
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+from starlette.middleware.gzip import GZipMiddleware
+
+from log import get_logger
+
+logger = get_logger("wire")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ormsgpack
+except ImportError:
+    ormsgpack = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Bodies smaller than this aren't worth compressing
+MINIMUM_COMPRESS_SIZE = 512
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def select_fields(content, fields):
+    """Keep only the comma-separated top-level ``fields`` of a dict payload."""
+    if not fields or not isinstance(content, dict):
+        return content
+    wanted = {field.strip() for field in fields.split(",")}
+    return {key: value for key, value in content.items() if key in wanted}
+
+
+def _accepts_json(accept):
+    return not accept or any(media in accept for media in ("application/json", "application/*", "*/*"))
+
+
+def respond(request, content, fields=None, status_code=200, headers=None):
+    content = select_fields(content, fields)
+    headers = {**(headers or {}), "Vary": "Accept"}
+    accept = request.headers.get("accept", "")
+    if MSGPACK_MEDIA_TYPE in accept:
+        if ormsgpack is not None:
+            body = ormsgpack.packb(content, option=ormsgpack.OPT_NON_STR_KEYS)
+            return Response(body, status_code=status_code, headers=headers, media_type=MSGPACK_MEDIA_TYPE)
+        if not _accepts_json(accept):
+            raise HTTPException(status_code=406, detail="MessagePack responses are not available on this server")
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def install(app):
+    """Compress responses over MINIMUM_COMPRESS_SIZE bytes for clients that accept it."""
+    if BrotliMiddleware is not None:
+        app.add_middleware(BrotliMiddleware, minimum_size=MINIMUM_COMPRESS_SIZE, gzip_fallback=True)
+    else:
+        logger.warning("brotli-asgi is not installed; compressing responses with gzip only")
+        app.add_middleware(GZipMiddleware, minimum_size=MINIMUM_COMPRESS_SIZE, compresslevel=6)